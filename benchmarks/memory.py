@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+"""
+Measure how much memory the expression nodes of a parsed stylesheet take.
+
+Usage: python benchmarks/memory.py [--baseline REV] [number of rules]
+
+With ``--baseline`` the clevercss package of the git revision REV is
+exported to a temporary directory and measured the same way, and both
+results are printed side by side.  The figures of the commit that added
+``__slots__`` to the nodes and packed colors into an int are::
+
+    python benchmarks/memory.py --baseline 0233c5b^ 5000
+
+``--tree PATH`` measures the clevercss package in PATH instead of the one
+next to this script and ``--json`` prints the raw results, that is how the
+baseline is measured.
+"""
+
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from optparse import OptionParser
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# set by load(), the tree to measure is only known after parsing the options
+expressions = Engine = None
+
+
+def load(tree):
+    global expressions, Engine
+    sys.path.insert(0, tree)
+    from clevercss import expressions
+    from clevercss.engine import Engine
+
+
+def generate(count):
+    lines = ['accent = #336699', 'unit = 4px']
+    for i in range(count):
+        lines.append('.item-%d, .other-%d:' % (i, i))
+        lines.append('    margin: $unit * %d 0 2px 1em' % i)
+        lines.append('    color: $accent.darken(%d%%)' % (i % 100))
+        lines.append('    background-color: red')
+        lines.append('    border: 1px solid #ccc')
+        lines.append('    font-family: Verdana, sans-serif')
+        lines.append('    div.content p, div.sidebar p:')
+        lines.append('        margin: 0')
+        lines.append('        a:')
+        lines.append('            color: red')
+        lines.append('            &:hover:')
+        lines.append('                text-decoration: underline')
+    return '\n'.join(lines)
+
+
+def attributes(node):
+    """The attribute values of a node, stored in slots or the dict."""
+    values = []
+    for cls in type(node).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if hasattr(node, name):
+                values.append(getattr(node, name))
+    values.extend(getattr(node, '__dict__', {}).values())
+    return values
+
+
+def node_size(node):
+    """
+    The size of a node including its dict and the numbers and tuples it
+    owns.  Strings and child nodes are not included.
+    """
+    size = sys.getsizeof(node)
+    if hasattr(node, '__dict__'):
+        size += sys.getsizeof(node.__dict__)
+    for value in attributes(node):
+        if isinstance(value, (float, tuple)) or \
+           isinstance(value, int) and not -5 <= value <= 256:
+            size += sys.getsizeof(value)
+    return size
+
+
+def deep_size(obj, seen):
+    """
+    The size of the containers and strings making up `obj`, each object is
+    counted once.  Expression nodes are not included.
+    """
+    if id(obj) in seen or isinstance(obj, expressions.Expr):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += deep_size(key, seen) + deep_size(value, seen)
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += deep_size(item, seen)
+    elif hasattr(obj, '__dict__'):
+        size += deep_size(obj.__dict__, seen)
+    return size
+
+
+def iter_nodes(node):
+    yield node
+    for child in node.iter_children():
+        for item in iter_nodes(child):
+            yield item
+
+
+def measure(count):
+    """Parse `count` generated rules and return what they take."""
+    source = generate(count)
+    engine = Engine(source)
+    rules_size = deep_size(engine.rules, set())
+    # shared literals are counted once
+    nodes = dict((id(node), node) for media, selectors, defs in engine.rules
+                 for key, expr in defs for node in iter_nodes(expr))
+    nodes = list(nodes.values())
+    del engine
+    gc.collect()
+
+    # parse the source again, this time tracing all allocations.  The
+    # engine has to stay alive until the traced memory is read.
+    tracemalloc.start()
+    engine = Engine(source)
+    total = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del engine
+    per_class = {}
+    for node in nodes:
+        size = node_size(node)
+        name = node.__class__.__name__
+        count_, total_ = per_class.get(name, (0, 0))
+        per_class[name] = count_ + 1, total_ + size
+    per_class['all nodes'] = (len(nodes),
+                              sum(size for n, size in per_class.values()))
+    return {'rules': count, 'per_class': per_class,
+            'rules_size': rules_size, 'total': total}
+
+
+def measure_revision(revision, count):
+    """Measure the clevercss package of a git revision in a subprocess."""
+    tree = tempfile.mkdtemp()
+    try:
+        archive = subprocess.Popen(['git', 'archive', revision, 'clevercss'],
+                                   cwd=ROOT, stdout=subprocess.PIPE)
+        subprocess.check_call(['tar', '-x', '-C', tree],
+                              stdin=archive.stdout)
+        if archive.wait():
+            raise SystemExit('git archive %s failed' % revision)
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), '--tree', tree,
+             '--json', str(count)], cwd=tree)
+        return json.loads(output.decode('utf-8'))
+    finally:
+        shutil.rmtree(tree)
+
+
+def megabytes(size):
+    return '%.1f MB' % (size / 1024.0 / 1024.0)
+
+
+def report(results, baseline=None):
+    columns = [results] if baseline is None else [baseline, results]
+    print('%d rules, %d distinct expression nodes' %
+          (results['rules'], results['per_class']['all nodes'][0]))
+    if baseline is not None:
+        print('%-16s %25s %25s' % ('', 'baseline', 'current'))
+    print('%-16s' % 'node' + ' %10s %14s' % ('count', 'bytes/node') *
+          len(columns))
+    names = set()
+    for column in columns:
+        names.update(column['per_class'])
+    names.discard('all nodes')
+    for name in sorted(names) + ['all nodes']:
+        line = '%-16s' % name
+        for column in columns:
+            n, size = column['per_class'].get(name, (0, 0))
+            line += ' %10d %14s' % (n, n and '%.1f' % (float(size) / n) or '-')
+        print(line)
+    for label, key in [('rule storage without nodes', 'rules_size'),
+                       ('total parse allocations', 'total')]:
+        print('%-27s' % (label + ':') + ''.join(
+            ' %12s' % megabytes(column[key]) for column in columns))
+
+
+def main():
+    parser = OptionParser(usage='%prog [options] [number of rules]')
+    parser.add_option('--baseline', metavar='REV',
+                      help='compare with the git revision REV')
+    parser.add_option('--tree', metavar='PATH', default=ROOT,
+                      help='measure the clevercss package in PATH')
+    parser.add_option('--json', action='store_true',
+                      help='print the results as JSON')
+    options, args = parser.parse_args()
+    count = args and int(args[0]) or 5000
+    baseline = None
+    if options.baseline:
+        baseline = measure_revision(options.baseline, count)
+    load(options.tree)
+    results = measure(count)
+    if options.json:
+        print(json.dumps(results))
+    else:
+        report(results, baseline)
+
+
+if __name__ == '__main__':
+    main()
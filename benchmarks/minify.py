@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+Compare the minified serializer of the engine with the old ``ccss
+--minified`` path, which rendered expanded CSS and minified it again
+with cssutils.
+
+Usage: python benchmarks/minify.py [number of rules]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+try:
+    import cssutils
+except ImportError:
+    cssutils = None
+
+import clevercss
+
+
+def generate(count):
+    lines = ['accent = #336699']
+    for i in range(count):
+        lines.append('.item-%d > a, .other-%d + p:' % (i, i))
+        lines.append('    margin: 0px 0.5em %dpx 0' % (i % 10))
+        lines.append('    color: $accent.darken(%d%%)' % (i % 100))
+        lines.append('    background: rgba(0, 0, 0, 0.25)')
+        lines.append('    font-family: Verdana, sans-serif')
+        lines.append('    &:hover:')
+        lines.append('        color: rgba(255, 255, 255, 1)')
+    return '\n'.join(lines)
+
+
+def timed(function, *args):
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+
+def native(source):
+    return clevercss.convert(source, minified=True)
+
+
+def with_cssutils(source):
+    css = cssutils.CSSParser().parseString(clevercss.convert(source))
+    cssutils.ser.prefs.useMinified()
+    return css.cssText
+
+
+def main():
+    count = len(sys.argv) > 1 and int(sys.argv[1]) or 5000
+    source = generate(count)
+    expanded_time, expanded = timed(clevercss.convert, source)
+    native_time, minified = timed(native, source)
+    print('%d rules' % count)
+    print('%-22s %8s %12s' % ('', 'seconds', 'bytes'))
+    print('%-22s %8.2f %12d' % ('expanded', expanded_time, len(expanded)))
+    print('%-22s %8.2f %12d' % ('native minified', native_time,
+                                len(minified)))
+    if cssutils is None:
+        print('cssutils is not installed, skipping the cssutils path')
+        return
+    cssutils.log.setLevel(50)
+    cssutils_time, result = timed(with_cssutils, source)
+    print('%-22s %8.2f %12d' % ('cssutils minified', cssutils_time,
+                                len(result)))
+
+
+if __name__ == '__main__':
+    main()
@@ -13,21 +13,120 @@ from clevercss import consts
 from clevercss import utils
 from clevercss import expressions
 from clevercss import engine
+from clevercss.variants import render_variants
 
 VERSION = '0.2.2.dev'
 
 class Context(dict):
+    minified = False
+    processes = None
+    custom_properties = ()
+    line_length = 2000
+    optimize = False
+    group_media = False
+    group_macros = False
+    canonical_order = False
+    fingerprint = None
+    inline_limit = 0
+    stats = None
+
     def __init__(self, *args, **kwargs):
         if args == (None,):
             args = ()
         super(Context, self).__init__(*args, **kwargs)
 
-def convert(source, context=None, fname=None, minified=False):
-    """Convert CleverCSS text into normal CSS."""
+def _make_context(context=None, **options):
+    """
+    Return a new `Context` with the items of `context` and the options of
+    `convert` set as attributes.  Unknown options are a `TypeError`.
+    """
     context = Context(context)
-    context.minified = minified
-    return engine.Engine(source, fname=fname).to_css(context)
+    for name, value in options.items():
+        if not hasattr(Context, name):
+            raise TypeError('unknown context option %r' % name)
+        if name == 'custom_properties':
+            value = tuple(value)
+        setattr(context, name, value)
+    return context
+
+def convert(source, context=None, fname=None, minified=False, processes=None,
+            custom_properties=(), max_selectors=None, line_length=2000,
+            optimize=False, group_media=False, group_macros=False,
+            canonical_order=False, fingerprint=None, inline_limit=0,
+            stats=None):
+    """
+    Convert CleverCSS text into normal CSS.  If `processes` is bigger than
+    one the rules are evaluated by that many worker processes.  Variables
+    named in `custom_properties` are output once as custom properties of
+    ``:root`` and referenced with ``var()``.  Rules whose nested selectors
+    expand to more than `max_selectors` selectors are a `ParserError`.
+    Minified output is broken into lines of about `line_length` characters
+    after a closing brace, ``0`` means no line breaks.  If `optimize` is
+    true the rules are optimized by `clevercss.optimizer` first.  If
+    `group_media` is true all rules of a media query are output in one
+    media block after the rules without media, ``'mobile-first'`` orders
+    the ``min-width`` queries from narrow to wide as well.  If
+    `group_macros` is true the declarations of a macro are output once for
+    all rules calling it where the cascade allows.  If `canonical_order`
+    is true declarations are sorted by property and similar rules moved
+    next to each other where the cascade allows, for better compression.
+    `fingerprint` adds the digest of the files referred to by ``url()``
+    and sprite maps to their URLs, ``'name'`` to the filename and
+    ``'query'`` as ``?v=`` parameter, see `clevercss.assets`.  Files
+    smaller than `inline_limit` bytes are inlined as ``data:`` URIs, if
+    `stats` is a dict their number and size are added to it.
+    """
+    context = _make_context(context, minified=minified, processes=processes,
+                            custom_properties=custom_properties,
+                            line_length=line_length, optimize=optimize,
+                            group_media=group_media,
+                            group_macros=group_macros,
+                            canonical_order=canonical_order,
+                            fingerprint=fingerprint,
+                            inline_limit=inline_limit, stats=stats)
+    return engine.Engine(source, fname=fname,
+                         max_selectors=max_selectors).to_css(context)
+
+def convert_to(fileobj, source, context=None, fname=None, minified=False,
+               processes=None, custom_properties=(), max_selectors=None,
+               line_length=2000, optimize=False, group_media=False,
+               group_macros=False, canonical_order=False, fingerprint=None,
+               inline_limit=0, stats=None):
+    """
+    Like `convert` but write the CSS to `fileobj` while the rules are
+    evaluated instead of returning it as one string.
+    """
+    context = _make_context(context, minified=minified, processes=processes,
+                            custom_properties=custom_properties,
+                            line_length=line_length, optimize=optimize,
+                            group_media=group_media,
+                            group_macros=group_macros,
+                            canonical_order=canonical_order,
+                            fingerprint=fingerprint,
+                            inline_limit=inline_limit, stats=stats)
+    engine.Engine(source, fname=fname,
+                  max_selectors=max_selectors).write_css(fileobj, context)
+
+def convert_variants(source, variants, context=None, fname=None,
+                     minified=False, processes=None, custom_properties=(),
+                     max_selectors=None, line_length=2000, group_media=False,
+                     fingerprint=None, inline_limit=0, stats=None):
+    """
+    Convert CleverCSS text once for every variant.  `variants` maps variant
+    names to contexts that are applied on top of `context`.  The source is
+    parsed once and the result is an ordered dict of variant names and CSS.
+    If `processes` is bigger than one the variants are rendered by that
+    many worker processes.  `stats` counts the data URIs of all variants.
+    """
+    context = _make_context(context, minified=minified, processes=processes,
+                            custom_properties=custom_properties,
+                            line_length=line_length, group_media=group_media,
+                            fingerprint=fingerprint,
+                            inline_limit=inline_limit, stats=stats)
+    return render_variants(engine.Engine(source, fname=fname,
+                                         max_selectors=max_selectors),
+                           variants, context)
 
-__all__ = ['convert', 'VERSION', '__doc__']
+__all__ = ['convert', 'convert_to', 'convert_variants', 'VERSION', '__doc__']
 
 # vim: et sw=4 sts=4
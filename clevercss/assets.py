@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+"""
+    Assets
+    ~~~~~~
+
+    Fingerprinting of the files stylesheets refer to with ``url()`` and
+    sprite maps::
+
+        css = clevercss.convert(source, fname='style.ccss',
+                                fingerprint='name')
+
+    With ``fingerprint='name'`` ``url(img/logo.png)`` becomes
+    ``url(img/logo.<digest>.png)``, with ``fingerprint='query'`` it becomes
+    ``url(img/logo.png?v=<digest>)``.  Relative URLs are resolved against
+    the directory of the source file, URLs of other hosts, absolute paths
+    and files that don't exist are left alone.
+
+    Small files can be inlined as ``data:`` URIs instead, which saves a
+    request per file::
+
+        css = clevercss.convert(source, fname='style.ccss',
+                                inline_limit=1024)
+
+    Files smaller than `inline_limit` bytes of a known type are inlined
+    base64 encoded, SVG images URL encoded if that is shorter.  URLs with a
+    fragment are not inlined, the fragment would be lost.  Pass a dict as
+    `stats` to learn how many were inlined::
+
+        stats = {}
+        css = clevercss.convert(source, fname='style.ccss',
+                                inline_limit=1024, stats=stats)
+
+    ``stats['data_uris']`` counts the ``url()`` targets replaced and
+    ``stats['data_uri_bytes']`` the length of their data URIs.
+
+    Digests and data URIs are cached by path and modification time, a file
+    is only read again once it changed.
+"""
+
+import base64
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+try:
+    from urllib.parse import quote, unquote
+except ImportError:
+    from urllib import quote, unquote
+
+FINGERPRINT_MODES = ('name', 'query')
+
+# types missing from the mimetypes module of some Python versions
+MIME_TYPES = {
+    '.svg':     'image/svg+xml',
+    '.webp':    'image/webp',
+    '.woff':    'font/woff',
+    '.woff2':   'font/woff2'
+}
+
+_remote_re = re.compile(r'^(?:[a-zA-Z][a-zA-Z0-9+.-]*:|//|/|#)')
+
+# characters URL encoded SVG can keep, everything else is percent encoded
+_svg_safe = "/:=;,!$&*+-.@_~?"
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _cached(kind, path, function):
+    # the result of function(path), computed again once the file changed
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = stat.st_mtime, stat.st_size
+    with _lock:
+        cached = _cache.get((kind, path))
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    result = function(path)
+    with _lock:
+        _cache[kind, path] = key, result
+    return result
+
+
+def _read(fname):
+    fileobj = open(fname, 'rb')
+    try:
+        return fileobj.read()
+    finally:
+        fileobj.close()
+
+
+def hash_file(fname):
+    """The first ten hex digits of the SHA-256 of the file `fname`."""
+    digest = hashlib.sha256()
+    fileobj = open(fname, 'rb')
+    try:
+        while True:
+            chunk = fileobj.read(65536)
+            if not chunk:
+                break
+            digest.update(chunk)
+    finally:
+        fileobj.close()
+    return digest.hexdigest()[:10]
+
+
+def file_digest(path):
+    """Like `hash_file` but cached by path and modification time."""
+    return _cached('digest', path, hash_file)
+
+
+def mime_type(path):
+    """The MIME type of the file `path`, `None` if it is unknown."""
+    ext = os.path.splitext(path)[1].lower()
+    return MIME_TYPES.get(ext) or mimetypes.guess_type(path)[0]
+
+
+def _encode(path):
+    data = _read(path)
+    mimetype = mime_type(path)
+    if mimetype is None:
+        return None
+    uri = 'data:%s;base64,%s' % (mimetype,
+                                 base64.b64encode(data).decode('ascii'))
+    if mimetype == 'image/svg+xml':
+        encoded = 'data:%s,%s' % (mimetype, quote(data, _svg_safe))
+        if len(encoded) < len(uri):
+            uri = encoded
+    return uri
+
+
+def data_uri(path):
+    """
+    The ``data:`` URI with the content of the file `path`, `None` if its
+    type is unknown.  Cached by path and modification time.
+    """
+    return _cached('data', path, _encode)
+
+
+def local_path(url, fname=None):
+    """
+    The file `url` refers to if it is relative, resolved against the
+    directory of the source file `fname`.  `None` for other URLs.
+    """
+    if not url or _remote_re.match(url):
+        return None
+    path = unquote(re.split(r'[?#]', url, 1)[0])
+    return os.path.join(os.path.dirname(fname or ''), *path.split('/'))
+
+
+def fingerprint(url, path, mode):
+    """
+    Add the digest of the file at `path` to `url` the way `mode` says.
+    If there is no such file `url` is returned as it is.
+    """
+    if mode not in FINGERPRINT_MODES:
+        raise ValueError('unknown fingerprint mode %r' % (mode,))
+    if path is None or not os.path.isfile(path):
+        return url
+    digest = file_digest(path)
+    url, hash, fragment = url.partition('#')
+    url, question, query = url.partition('?')
+    if mode == 'name':
+        root, ext = posixpath.splitext(url)
+        url = '%s.%s%s' % (root, digest, ext)
+    else:
+        query = (query and query + '&') + 'v=' + digest
+        question = '?'
+    return url + question + query + hash + fragment
+
+
+def _unquote(url):
+    if len(url) > 1 and url[0] in '"\'' and url[-1] == url[0]:
+        return url[0], url[1:-1]
+    return '', url
+
+
+def fingerprint_url(url, fname, mode):
+    """
+    Fingerprint the target of a ``url()``, resolved against the source
+    file `fname`.  Quotes around `url` are kept.
+    """
+    mark, url = _unquote(url)
+    return mark + fingerprint(url, local_path(url, fname), mode) + mark
+
+
+def inline_url(url, fname, limit):
+    """
+    The data URI for the target of a ``url()`` if it is a file smaller
+    than `limit` bytes, else `url` as it is.
+    """
+    unquoted = _unquote(url)[1]
+    path = local_path(unquoted, fname)
+    if path is None or '#' in unquoted or not os.path.isfile(path) or \
+       os.path.getsize(path) >= limit:
+        return url
+    return data_uri(path) or url
+
+
+def count_inlined(stats, uri):
+    """Count the data URI `uri` in the dict `stats`."""
+    stats['data_uris'] = stats.get('data_uris', 0) + 1
+    stats['data_uri_bytes'] = stats.get('data_uri_bytes', 0) + len(uri)
+
+
+def add_stats(stats, other):
+    """Add the counts of the dict `other` to `stats`."""
+    for key, value in other.items():
+        stats[key] = stats.get(key, 0) + value
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+"""
+    Builder
+    ~~~~~~~
+
+    Build a stylesheet from Python instead of generating CleverCSS source
+    that is tokenized again right away::
+
+        from clevercss.builder import Stylesheet
+        from clevercss.expressions import Color, Value, Var
+
+        sheet = Stylesheet()
+        sheet.variable('accent', Color('#336699'))
+        with sheet.rule('ul#comments, ol#comments') as comments:
+            comments.define('margin', 0)
+            with comments.rule('li') as item:
+                item.define('color', Var('accent'))
+                item.define('padding', Value(0.4, 'em'))
+            comments.rule('&:hover').define('background', 'white')
+        sheet.media('print').rule('#nav').define('display', 'none')
+        css = sheet.to_css()
+
+    Values are nodes of `clevercss.expressions`, Python numbers become
+    `Number` nodes and strings are output as they are, like backquoted
+    strings.  Nested rules, ``&`` references and media blocks work like
+    they do in source code.
+"""
+
+from clevercss import _make_context
+from clevercss.engine import Engine, Parser
+from clevercss.expressions import Backstring, Expr, Number
+
+
+def node(value):
+    """Return `value` as an expression node."""
+    if isinstance(value, Expr):
+        return value
+    if isinstance(value, bool):
+        raise TypeError('booleans are no CSS values')
+    if isinstance(value, (int, float)):
+        return Number.intern(value)
+    if isinstance(value, str):
+        return Backstring(value)
+    raise TypeError('cannot use %r as a CSS value' % (value,))
+
+
+def _selector(selector):
+    if isinstance(selector, (tuple, list)):
+        return ', '.join(selector)
+    return selector
+
+
+class _Container(object):
+
+    def __init__(self):
+        self.children = []
+
+    def rule(self, selector):
+        """
+        Add a nested rule and return it.  `selector` is a string of comma
+        separated selectors or a list of selectors.
+        """
+        block = Block(_selector(selector))
+        self.children.append(block)
+        return block
+
+    def media(self, query):
+        """Add a media block for `query` and return it."""
+        block = Block('@media ' + query)
+        self.children.append(block)
+        return block
+
+    def _tree(self):
+        return [child._tree() for child in self.children]
+
+
+class Block(_Container):
+    """
+    A rule or media block.  It can be used as context manager, that only
+    makes nested blocks easier to read.
+    """
+
+    def __init__(self, selector):
+        _Container.__init__(self)
+        self.selector = selector
+        self.definitions = []
+
+    def define(self, key, value):
+        """Add the property `key` and return the block."""
+        self.definitions.append((None, key, node(value)))
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+    def _tree(self):
+        return (self.selector, _Container._tree(self),
+                list(self.definitions), None)
+
+
+class Stylesheet(_Container):
+    """
+    The root of a built stylesheet.  Definitions are only allowed in
+    rules, the stylesheet itself has variables.
+    """
+
+    def __init__(self):
+        _Container.__init__(self)
+        self.variables = {}
+
+    def variable(self, name, value):
+        """Define the variable `name`.  It overrides the context."""
+        self.variables[name] = node(value)
+        return self
+
+    def engine(self, max_selectors=None):
+        """Return an `Engine` for the stylesheet as it is now."""
+        parser = Parser(max_selectors=max_selectors)
+        return Engine.from_rules(parser.compile(self._tree()),
+                                 self.variables, parser)
+
+    def to_css(self, context=None, minified=False, processes=None,
+               custom_properties=(), max_selectors=None, line_length=2000,
+               optimize=False, group_media=False, group_macros=False,
+               canonical_order=False, fingerprint=None, inline_limit=0,
+               stats=None):
+        """Generate CSS, the arguments are those of `convert`."""
+        context = _make_context(context, minified=minified,
+                                processes=processes,
+                                custom_properties=custom_properties,
+                                line_length=line_length, optimize=optimize,
+                                group_media=group_media,
+                                group_macros=group_macros,
+                                canonical_order=canonical_order,
+                                fingerprint=fingerprint,
+                                inline_limit=inline_limit, stats=stats)
+        return self.engine(max_selectors).to_css(context)
+
+# vim: et sw=4 sts=4
@@ -1,10 +1,21 @@
 #!/usr/bin/env python
 
 from optparse import OptionParser
+import filecmp
+import gzip
+import json
+import os
 import re
 import sys
+from sys import version_info
+if version_info >= (2, 7):
+    from collections import OrderedDict
+else:
+    from ordereddict import OrderedDict
 
 import clevercss
+from clevercss import assets
+from clevercss import optimizer
 from clevercss.errors import *
 
 help_text = '''
@@ -18,6 +29,15 @@ must not give your source file a .css extension.
 
 if you call it without arguments it will read from stdin and
 write the converted css to stdout.
+
+with --variants the given JSON file maps variant names to contexts.
+every source file is parsed once and rendered for each variant to
+"<name>.<variant>.css".
+
+with --hash-names the output goes to "<name>.<hash>.css" instead, the
+hash changes with the content.  --manifest records the file written for
+every "<name>.css" in a JSON file.  files whose content did not change
+are never rewritten.
 '''
 
 version_text = '''\
@@ -38,6 +58,56 @@ def main():
             help='convert css files to ccss')
     parser.add_option('--minified', action='store_true',
             help='minify the resulting css')
+    parser.add_option('--optimize', action='store_true',
+            help='merge and fold rules, drop overridden declarations and '
+                 'report the bytes saved')
+    parser.add_option('--group-macros', action='store_true',
+            dest='group_macros',
+            help='output the declarations of a macro once for all rules '
+                 'calling it')
+    parser.add_option('--canonical-order', action='store_true',
+            dest='canonical_order',
+            help='sort declarations and cluster similar rules for better '
+                 'compression')
+    parser.add_option('--gzip', action='store_true',
+            help='also write a maximally compressed .css.gz next to every '
+                 '.css and report the sizes')
+    parser.add_option('--hash-names', action='store_true', dest='hash_names',
+            help='put a hash of the content into the output filenames')
+    parser.add_option('--manifest', metavar='FILE',
+            help='map the output filenames to the written files in the '
+                 'JSON FILE')
+    parser.add_option('--fingerprint', type='choice', metavar='MODE',
+            choices=assets.FINGERPRINT_MODES,
+            help='add the digest of the files referred to by url() to the '
+                 'filename (MODE "name") or as query (MODE "query")')
+    parser.add_option('--inline-limit', type='int', metavar='BYTES',
+            dest='inline_limit', default=0,
+            help='inline files smaller than BYTES referred to by url() as '
+                 'data URIs and report the inlined bytes')
+    parser.add_option('--group-media', action='store_true',
+            dest='group_media',
+            help='output all rules of a media query in one block')
+    parser.add_option('--mobile-first', action='store_true',
+            dest='mobile_first',
+            help='group media queries and order min-width queries from '
+                 'narrow to wide')
+    parser.add_option('--line-length', type='int', metavar='N',
+            dest='line_length', default=2000,
+            help='break minified lines after N characters, 0 never breaks '
+                 'them (default=2000)')
+    parser.add_option('--variants', metavar='FILE',
+            help='render every file once per variant defined in the JSON FILE')
+    parser.add_option('--processes', type='int', metavar='N',
+            help='evaluate with N worker processes')
+    parser.add_option('--custom-properties', metavar='NAMES',
+            dest='custom_properties', default='',
+            help='output the comma separated variables NAMES as css '
+                 'custom properties')
+    parser.add_option('--max-selectors', type='int', metavar='N',
+            dest='max_selectors',
+            help='fail on rules whose nested selectors expand to more '
+                 'than N selectors')
 
     (options, args) = parser.parse_args()
     if options.eigen_test:
@@ -52,11 +122,11 @@ def main():
     else:
         convert_stream()
 
-import cssutils
-import logging
-cssutils.log.setLevel(logging.FATAL)
-
 def parseCSS(text):
+    # cssutils is only needed to convert css back to ccss
+    import cssutils
+    import logging
+    cssutils.log.setLevel(logging.FATAL)
     parser = cssutils.CSSParser()
     css = parser.parseString(text)
     rules = {}
@@ -109,36 +179,254 @@ def convert_stream():
         sys.stderr.write('Error: %s\n' % e)
         sys.exit(1)
 
-def convert_many(files, options):
-    for fname in files:
-        target = fname.rsplit('.', 1)[0] + '.css'
-        if fname == target:
-            sys.stderr.write('Error: same name for '
-                             'source and target file "%s".' % fname)
-            sys.exit(2)
-        elif options.no_overwrite and os.path.exists(target):
-            sys.stderr.write('File exists (and --no-overwrite was used) "%s".' % target)
-            sys.exit(3)
+def load_variants(fname):
+    fileobj = open(fname)
+    try:
+        variants = json.load(fileobj, object_pairs_hook=OrderedDict)
+    finally:
+        fileobj.close()
+    if not isinstance(variants, dict) or \
+       not all(isinstance(v, dict) for v in variants.values()):
+        sys.stderr.write('Error: %s must map variant names to contexts.\n'
+                         % fname)
+        sys.exit(2)
+    return variants
 
-        src = open(fname)
+def group_media(options):
+    if options.mobile_first:
+        return 'mobile-first'
+    return bool(options.group_media)
+
+def context_options(options, custom_properties, stats=None):
+    """
+    The keyword arguments of `clevercss.convert` the options ask for, the
+    data URIs are counted in `stats`.
+    """
+    return dict(minified=options.minified, processes=options.processes,
+                custom_properties=custom_properties,
+                line_length=options.line_length,
+                group_media=group_media(options),
+                group_macros=options.group_macros,
+                canonical_order=options.canonical_order,
+                fingerprint=options.fingerprint,
+                inline_limit=options.inline_limit, stats=stats)
+
+def write_streamed(partial, source, fname, options, custom_properties,
+                   inlined=None):
+    """
+    Convert `source` into the file `partial`.  Returns the report of the
+    optimizer if the output is optimized and `None` otherwise.  The data
+    URIs are counted in `inlined`.
+    """
+    stats = None
+    dst = open(partial, 'w')
+    try:
         try:
+            if options.optimize:
+                stats = write_optimized(dst, source, fname, options,
+                                        custom_properties, inlined)
+            else:
+                clevercss.convert_to(dst, source, fname=fname,
+                                     max_selectors=options.max_selectors,
+                                     **context_options(options,
+                                                       custom_properties,
+                                                       inlined))
+        finally:
+            dst.close()
+    except:
+        os.remove(partial)
+        raise
+    return stats
+
+def replace_file(partial, target):
+    """
+    Move `partial` to `target` unless `target` has the same content
+    already, then it is kept as it is.  Returns whether it was replaced.
+    """
+    if os.path.exists(target) and filecmp.cmp(partial, target, False):
+        os.remove(partial)
+        return False
+    if os.name == 'nt' and os.path.exists(target):
+        os.remove(target)
+    os.rename(partial, target)
+    return True
+
+def publish(target, options):
+    """
+    Move the finished ``target.part`` file to `target`, with --hash-names
+    to ``<name>.<hash>.css``, and return the name of the file.
+    """
+    partial, fname = target + '.part', target
+    if options.hash_names:
+        root, ext = os.path.splitext(target)
+        fname = '%s.%s%s' % (root, assets.hash_file(partial), ext)
+    if not replace_file(partial, fname):
+        print('%s is unchanged.' % fname)
+    elif fname != target:
+        print('Saved as %s.' % fname)
+    return fname
+
+def write_gzip(target):
+    """
+    Compress `target` into ``target.gz`` at maximum compression and return
+    the sizes of both files.
+    """
+    partial = target + '.gz.part'
+    src = open(target, 'rb')
+    try:
+        raw = open(partial, 'wb')
+        try:
+            # no timestamp, the same css always gives the same file
+            dst = gzip.GzipFile(os.path.basename(target), 'wb', 9, raw,
+                                mtime=0)
             try:
-                converted = clevercss.convert(src.read(), fname=fname)
-            except (ParserError, EvalException) as e:
-                sys.stderr.write('Error in file %s: %s\n' % (fname, e))
-                sys.exit(1)
-            if options.minified:
-                css = cssutils.CSSParser().parseString(converted)
-                cssutils.ser.prefs.useMinified()
-                converted = css.cssText
-            dst = open(target, 'w')
-            try:
-                print('Writing output to %s...' % target)
-                dst.write(converted)
+                while True:
+                    chunk = src.read(65536)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
             finally:
                 dst.close()
+        finally:
+            raw.close()
+    finally:
+        src.close()
+    replace_file(partial, target + '.gz')
+    return os.path.getsize(target), os.path.getsize(target + '.gz')
+
+def report_gzip(target):
+    size, compressed = write_gzip(target)
+    print('%s: %d bytes, %d bytes gzipped' % (target, size, compressed))
+
+def report_inlined(target, inlined):
+    print('%s: %d data URIs, %d bytes' % (target,
+                                          inlined.get('data_uris', 0),
+                                          inlined.get('data_uri_bytes', 0)))
+
+def write_optimized(dst, source, fname, options, custom_properties,
+                    inlined=None):
+    context = clevercss._make_context(
+        None, **context_options(options, custom_properties, inlined))
+    engine = clevercss.engine.Engine(source, fname=fname,
+                                     max_selectors=options.max_selectors)
+    css, stats = optimizer.optimize_css(engine, context)
+    dst.write(css)
+    return stats
+
+def convert_many(files, options):
+    custom_properties = [name.strip() for name in
+                         options.custom_properties.split(',') if name.strip()]
+    variants = None
+    if options.variants:
+        for name in ('optimize', 'group_macros', 'canonical_order'):
+            if getattr(options, name):
+                sys.stderr.write('Error: --%s can\'t be used with '
+                                 '--variants.\n' % name.replace('_', '-'))
+                sys.exit(2)
+        variants = load_variants(options.variants)
+    written = OrderedDict()
+    for fname in files:
+        base = fname.rsplit('.', 1)[0]
+        if variants is None:
+            targets = [base + '.css']
+        else:
+            targets = ['%s.%s.css' % (base, name) for name in variants]
+        for target in targets:
+            if fname == target:
+                sys.stderr.write('Error: same name for '
+                                 'source and target file "%s".' % fname)
+                sys.exit(2)
+            elif options.no_overwrite and not options.hash_names and \
+                    os.path.exists(target):
+                sys.stderr.write('File exists (and --no-overwrite was used) "%s".' % target)
+                sys.exit(3)
+
+        inlined = {} if options.inline_limit else None
+        src = open(fname)
+        try:
+            if variants is None:
+                # written while the rules are evaluated, the target is only
+                # replaced once all of them succeeded
+                print('Writing output to %s...' % targets[0])
+                try:
+                    stats = write_streamed(targets[0] + '.part', src.read(),
+                                           fname, options, custom_properties,
+                                           inlined)
+                except (ParserError, EvalException) as e:
+                    sys.stderr.write('Error in file %s: %s\n' % (fname, e))
+                    sys.exit(1)
+                if stats is not None:
+                    print('Optimized %d rules into %d, saved %d bytes.' %
+                          (stats['rules_before'], stats['rules_after'],
+                           stats['bytes_saved']))
+                results = [None]
+            else:
+                kwargs = context_options(options, custom_properties, inlined)
+                # both were rejected above, variants can't group
+                del kwargs['group_macros'], kwargs['canonical_order']
+                try:
+                    results = clevercss.convert_variants(
+                        src.read(), variants, fname=fname,
+                        max_selectors=options.max_selectors,
+                        **kwargs).values()
+                except (ParserError, EvalException) as e:
+                    sys.stderr.write('Error in file %s: %s\n' % (fname, e))
+                    sys.exit(1)
         finally:
             src.close()
+        for target, converted in zip(targets, results):
+            if converted is not None:
+                print('Writing output to %s...' % target)
+                dst = open(target + '.part', 'w')
+                try:
+                    dst.write(converted)
+                finally:
+                    dst.close()
+            written[target] = publish(target, options)
+            if options.gzip:
+                report_gzip(written[target])
+        if inlined is not None:
+            # the variants of a file are counted together
+            report_inlined(fname if variants else written[targets[0]],
+                           inlined)
+    if options.manifest:
+        write_manifest(options.manifest, written)
+
+def write_manifest(fname, written):
+    """
+    Add the files in `written` to the JSON manifest `fname`, which maps
+    the names of the output files to the files actually written, both
+    relative to the manifest.  Entries of other files are kept.  The
+    directory of the manifest is created if it doesn't exist.
+    """
+    root = os.path.dirname(os.path.abspath(fname))
+    if not os.path.isdir(root):
+        os.makedirs(root)
+
+    def relative(path):
+        return os.path.relpath(os.path.abspath(path), root).replace(os.sep, '/')
+
+    manifest = {}
+    if os.path.exists(fname):
+        fileobj = open(fname)
+        try:
+            manifest = json.load(fileobj)
+        finally:
+            fileobj.close()
+        if not isinstance(manifest, dict):
+            sys.stderr.write('Error: %s is not a manifest.\n' % fname)
+            sys.exit(2)
+    for target, path in written.items():
+        manifest[relative(target)] = relative(path)
+    dst = open(fname + '.part', 'w')
+    try:
+        json.dump(manifest, dst, indent=2, sort_keys=True,
+                  separators=(',', ': '))
+        dst.write('\n')
+    finally:
+        dst.close()
+    if replace_file(fname + '.part', fname):
+        print('Wrote manifest %s.' % fname)
 
 if __name__ == '__main__':
     main()
@@ -28,6 +28,10 @@ UNIT_MAPPING = {}
 for measures, units in CONV.items():
     UNIT_MAPPING.update(dict((unit, measures) for unit in units))
 
+# units of lengths, a zero length needs no unit in minified output
+LENGTH_UNITS = frozenset(['em', 'ex', 'ch', 'rem', 'vw', 'vh', 'vmin',
+                          'vmax', 'px', 'cm', 'mm', 'q', 'in', 'pt', 'pc'])
+
 # color literals
 COLORS = {
     'aliceblue': '#f0f8ff',
@@ -187,6 +191,11 @@ regex = {
     'multi_comment': re.compile(r'/\*.+?\*/', re.S),
     'macros_def': re.compile(r'^def ([a-zA-Z-]+)\s*:\s*$'),
     'macros_call': re.compile(r'^\$([a-zA-Z-]+)'),
+    'for_loop': re.compile(r'^for\s+\$([a-zA-Z_][a-zA-Z0-9_]*)\s+in\s+'
+                           r'(-?\d+)\s*\.\.\s*(-?\d+)$'),
+    # min-width of a media query, for mobile first output
+    'min_width': re.compile(r'min-width\s*:\s*(\d+(?:\.\d*)?|\.\d+)\s*'
+                            r'(px|em|rem)'),
     # regular expressions for the expr parser
     'vendorprefix': re.compile(r'-(?:moz|webkit)-[a-z-]+'),
     'operator': re.compile('|'.join(re.escape(x) for x in OPERATORS)),
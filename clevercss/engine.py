@@ -2,6 +2,7 @@
 
 import sys
 import re
+import copy
 import colorsys
 import operator
 from sys import version_info
@@ -15,6 +16,9 @@ from clevercss import utils
 from clevercss import errors
 from clevercss import expressions
 from clevercss import line_iterator
+from clevercss import parallel
+from clevercss import optimizer
+from clevercss.ruletable import RuleTable
 import os
 from clevercss.errors import *
 
@@ -24,102 +28,459 @@ class Engine(object):
     nobody uses this because the `convert` function wraps it.
     """
 
-    def __init__(self, source, parser=None, fname=None):
+    def __init__(self, source, parser=None, fname=None, max_selectors=None):
         if parser is None:
-            parser = Parser(fname=fname)
+            parser = Parser(fname=fname, max_selectors=max_selectors)
+        self._setup(parser, *parser.parse(source))
+
+    @classmethod
+    def from_rules(cls, rules, variables=None, parser=None):
+        """
+        Create an engine for a `RuleTable` and a dict of variables that
+        are already parsed, e.g. by `clevercss.builder`.
+        """
+        engine = cls.__new__(cls)
+        engine._setup(parser or Parser(), rules,
+                      OrderedDict(variables or {}), OrderedDict())
+        return engine
+
+    def _setup(self, parser, rules, variables, imports):
         self._parser = parser
-        self.rules, self._vars, self._imports = parser.parse(source)
+        self.rules, self._vars, self._imports = rules, variables, imports
+        self._imported = [Engine(text, fname=path,
+                                 max_selectors=parser.max_selectors)
+                          for path, (lineno, text) in self._imports.items()]
+        self._dependencies = None
+        self._dependents = None
+        self._references = None
+        self._variables = None
+        self._closures = None
 
     def evaluate(self, context=None):
-        """Evaluate code."""
-        expr = None
+        """
+        Evaluate code.  The context passed is never modified, every call
+        works on a private copy of it so that one engine can be evaluated
+        from multiple threads at the same time.
+        """
+        context = self.bind_context(context)
+        for rule in self.iter_rules(context):
+            yield self.evaluate_rule(rule, context)
+
+    def parse_context(self, context=None):
+        """
+        Return a copy of the context with all string values parsed and
+        Python numbers turned into `Number` nodes.  Expression nodes such
+        as `Value` or `Color` are used as they are.
+        """
         if context is None:
             context = {}
         elif not isinstance(context, dict):
             raise TypeError("context argument must be a dictionary")
+        context = copy.copy(context)
 
         for key, value in context.items():
             if isinstance(value, str):
-                expr = self._parser.parse_expr(1, value)
-                context[key] = expr
+                context[key] = self._parser.parse_expr(1, value)
+            elif isinstance(value, (int, float)) and \
+                    not isinstance(value, bool):
+                context[key] = expressions.Number.intern(value)
+        return context
+
+    def bind_context(self, context=None):
+        """
+        Return a private copy of the context with string values parsed and
+        the variables of the stylesheet and its imports added.  Variables
+        defined in the stylesheet override those of the context.
+        """
+        context = self.parse_context(context)
+        self._bind(context)
+        return context
+
+    def _bind(self, context):
         context.update(self._vars)
+        for engine in self._imported:
+            engine._bind(context)
 
-        # pull in imports
-        for fname, source in self._imports.items():
-          for media, selectors, defs in Engine(source[1], fname=fname).evaluate(context):
-            yield media, selectors, defs
+    def iter_rules(self, context=None):
+        """
+        Iterate over the parsed rules, the rules of imported stylesheets
+        first.  If the context asks for variables as custom properties a
+        ``:root`` rule defining them comes first.
+        """
+        root_rule = self._root_rule(context)
+        if root_rule is not None:
+            yield root_rule
+        for rule in self._iter_rules():
+            yield rule
 
-        for media, selectors, defs in self.rules:
-            all_defs = []
-            for key, expr in defs:
-                string_expr = expr.to_string(context)
-                try:
-                    prefixes = consts.browser_specific_expansions[key]
-                except KeyError:
-                    all_defs.append((key, string_expr))
-                else:
-                    for prefix in prefixes:
-                        all_defs.append(('-%s-%s' % (prefix, key), string_expr))
-            yield media, selectors, all_defs
+    def iter_macro_calls(self, context=None):
+        """
+        Like `iter_rules` but yield ``(rule, macro_calls)`` pairs, see
+        `RuleTable.macro_calls`.
+        """
+        root_rule = self._root_rule(context)
+        if root_rule is not None:
+            yield root_rule, ()
+        for engine in self._engines():
+            rules = engine.rules
+            for idx, rule in enumerate(rules):
+                yield rule, rules.macro_calls.get(idx, ())
+
+    def _iter_rules(self):
+        for engine in self._engines():
+            for rule in engine.rules:
+                yield rule
+
+    def _engines(self):
+        # the imported engines in the order of their rules, this one last
+        engines = []
+        for engine in self._imported:
+            engines.extend(engine._engines())
+        engines.append(self)
+        return engines
+
+    def _root_rule(self, context):
+        names = getattr(context, 'custom_properties', None)
+        if not names:
+            return None
+        references = {}
+        engines = self._engines()
+        if not all(name in context or
+                   any(name in engine._vars for engine in engines)
+                   for name in names):
+            # an undefined variable is an error, find its line
+            references = self._reference_lines()
+        return None, [':root'], [('--' + name, expressions.CustomProperty(
+                                      name, references.get(name)))
+                                 for name in names]
+
+    def _reference_lines(self):
+        # the line of the first reference to every variable
+        if self._references is None:
+            references = {}
+            for engine in self._engines():
+                exprs = [expr for media, selectors, defs in engine.rules
+                         for key, expr in defs]
+                exprs.extend(engine._vars.values())
+                for node in _iter_nodes(exprs):
+                    if isinstance(node, expressions.Var) and \
+                       node.lineno is not None:
+                        lineno = references.get(node.name)
+                        if lineno is None or node.lineno < lineno:
+                            references[node.name] = node.lineno
+            self._references = references
+        return self._references
+
+    def evaluate_rule(self, rule, context):
+        """Evaluate a single parsed rule against a bound context."""
+        media, selectors, defs = rule
+        all_defs = []
+        for key, expr in defs:
+            string_expr = expr.to_string(context)
+            try:
+                prefixes = consts.browser_specific_expansions[key]
+            except KeyError:
+                all_defs.append((key, string_expr))
+            else:
+                for prefix in prefixes:
+                    all_defs.append(('-%s-%s' % (prefix, key), string_expr))
+        return media, selectors, all_defs
+
+    def selector_expansion(self):
+        """
+        Return the expansion factor of the selectors of every rule in the
+        order of `iter_rules` without a custom properties rule.  A factor
+        of 1 means every selector part is output once, nested comma
+        separated selectors multiply.
+        """
+        factors = []
+        for engine in self._imported:
+            factors.extend(engine.selector_expansion())
+        factors.extend(self.rules.expansion(idx)
+                       for idx in range(len(self.rules)))
+        return factors
+
+    def dependencies(self, context=None):
+        """
+        Return a list with a set of variable names for every rule in the
+        order of `iter_rules`.  A rule depends on the variables it refers
+        to directly or through macros, and on everything those variables
+        refer to in turn.  Names the stylesheet doesn't define are kept
+        as they are, they have to come from the context.
+        """
+        if self._dependencies is None:
+            self._dependencies = [self._rule_dependencies(rule)
+                                  for rule in self._iter_rules()]
+        root_rule = self._root_rule(context)
+        if root_rule is None:
+            return self._dependencies
+        return [self._rule_dependencies(root_rule)] + self._dependencies
+
+    def _rule_dependencies(self, rule):
+        if self._closures is None:
+            self._variables = {}
+            self._bind(self._variables)
+            self._closures = {}
+        names = set()
+        for key, expr in rule[2]:
+            for name in expr.variables():
+                if name not in self._closures:
+                    closure = set([name])
+                    todo = [name]
+                    while todo:
+                        value = self._variables.get(todo.pop())
+                        if value is None:
+                            continue
+                        for ref in value.variables():
+                            if ref not in closure:
+                                closure.add(ref)
+                                todo.append(ref)
+                    self._closures[name] = frozenset(closure)
+                names.update(self._closures[name])
+        return frozenset(names)
+
+    def dependent_rules(self, names, context=None):
+        """
+        Return the sorted indices of the rules that depend on one of the
+        variables in `names`.  The variables of a parsed context may refer
+        to each other too, those references are followed first.
+        """
+        if self._dependents is None:
+            dependents = {}
+            for idx, rule_names in enumerate(self.dependencies()):
+                for name in rule_names:
+                    dependents.setdefault(name, []).append(idx)
+            self._dependents = dependents
+
+        names = set(names)
+        refs = {}
+        for key, value in (context or {}).items():
+            if isinstance(value, expressions.Expr):
+                for ref in value.variables():
+                    refs.setdefault(ref, set()).add(key)
+        todo = list(names)
+        while todo:
+            for key in refs.get(todo.pop(), ()):
+                if key not in names:
+                    names.add(key)
+                    todo.append(key)
+
+        affected = set()
+        offset = 0
+        root_rule = self._root_rule(context)
+        if root_rule is not None:
+            offset = 1
+            if names & self._rule_dependencies(root_rule):
+                affected.add(0)
+        for name in names:
+            affected.update(idx + offset
+                            for idx in self._dependents.get(name, ()))
+        return sorted(affected)
 
     def to_css(self, context=None):
         """Evaluate the code and generate a CSS file."""
-        if context.minified:
-            return self.to_css_min(context)
-        blocks = []
+        return u''.join(self.iter_css(context))
+
+    def to_css_min(self, context=None):
+        """Evaluate the code and generate a CSS file."""
+        return u''.join(self.iter_blocks(self.format_rules(context, True),
+                                         True, context.line_length,
+                                         context.group_media))
+
+    def iter_css(self, context=None):
+        """
+        Evaluate the code and yield the CSS file in pieces, rule by rule.
+        Joined they are the result of `to_css`.
+        """
+        minified = context.minified
+        return self.iter_blocks(self.format_rules(context, minified),
+                                minified, context.line_length,
+                                context.group_media)
+
+    def write_css(self, fileobj, context=None, buffer_size=65536):
+        """
+        Evaluate the code and write the CSS file to `fileobj` while rules
+        are evaluated.  The pieces are collected up to about `buffer_size`
+        characters per write.
+        """
+        parts = []
+        size = 0
+        for part in self.iter_css(context):
+            parts.append(part)
+            size += len(part)
+            if size >= buffer_size:
+                fileobj.write(u''.join(parts))
+                parts = []
+                size = 0
+        if parts:
+            fileobj.write(u''.join(parts))
+
+    def format_rules(self, context, minified=False):
+        """
+        Evaluate the code and yield a ``(media, block)`` pair for every
+        rule.  If the context asks for more than one process the rules are
+        evaluated by a pool of worker processes, if it asks for optimized,
+        grouped or ordered output they are passed through `optimizer`.
+        """
+        if context.optimize or context.group_macros or \
+           context.canonical_order:
+            return ((media, self.format_rule(media, selectors, defs,
+                                             minified))
+                    for media, selectors, defs in
+                    optimizer.process(self, context))
+        if context.processes and context.processes > 1:
+            return parallel.format_rules(self, context, context.processes,
+                                         minified)
+        return ((media, self.format_rule(media, selectors, defs, minified))
+                for media, selectors, defs in self.evaluate(context))
+
+    def format_rule(self, media, selectors, defs, minified=False):
+        """Generate the CSS block for one evaluated rule."""
+        if minified:
+            return u'%s{%s}' % (u','.join(utils.minify_selector(selector)
+                                          for selector in selectors),
+                                u';'.join(u'%s:%s' % kv for kv in defs))
+        if media:
+            indent = '  '
+        else:
+            indent = ''
+        block = [indent + u',\n'.join(selectors) + ' {']
+        for key, value in defs:
+            block.append(indent + u'  %s: %s;' % (key, value))
+        block.append(indent + u'}')
+        return u'\n'.join(block)
+
+    def join_rules(self, blocks, minified=False, line_length=2000,
+                   group_media=False):
+        """
+        Join ``(media, block)`` pairs as generated by `format_rule` into a
+        CSS file, opening and closing media blocks as needed.  Minified
+        lines are broken after the first closing brace at `line_length`
+        characters, ``0`` keeps everything on one line.  See
+        `group_media_blocks` for `group_media`.
+        """
+        return u''.join(self.iter_blocks(blocks, minified, line_length,
+                                         group_media))
+
+    def iter_blocks(self, blocks, minified=False, line_length=2000,
+                    group_media=False):
+        """Like `join_rules` but yield the CSS file in pieces."""
+        if group_media:
+            blocks = group_media_blocks(blocks, group_media == 'mobile-first')
+        if minified:
+            return self._iter_css_min(blocks, line_length)
+        return self._iter_css(blocks)
+
+    def _iter_css(self, blocks):
         current_media = None
-        for media, selectors, defs in self.evaluate(context):
-            if media:
-                indent = '  '
-            else:
-                indent = ''
-            block = []
+        separator = u''
+        for media, block in blocks:
+            head = []
             if media != current_media:
                 if current_media:
-                    block.append('}\n\n')
+                    head.append('}\n\n')
                 if media:
-                    block.append('@media %s {\n' % media)
+                    head.append('@media %s {\n' % media)
                 current_media = media
-            block.append(indent + u',\n'.join(selectors) + ' {')
-            for key, value in defs:
-                block.append(indent + u'  %s: %s;' % (key, value))
-            block.append(indent + u'}')
-            blocks.append(u'\n'.join(block))
+            head.append(block)
+            yield separator + u'\n'.join(head)
+            separator = u'\n\n'
         if current_media:
-            blocks.append('}')
-        return u'\n\n'.join(blocks)
+            yield separator + u'}'
 
-    def to_css_min(self, context=None):
-        """Evaluate the code and generate a CSS file."""
-        parts = []
+    def _iter_css_min(self, blocks, line_length=2000):
+        # Some browsers/editors choke on extremely long lines.
+        # Output lines of `line_length` characters or more, broken after a
+        # closing brace.  `column` counts the characters since the last
+        # break, so every character is looked at once.
+        if not line_length:
+            for part in self._iter_blocks_min(blocks):
+                yield part
+            return
+        column = 0
+        for part in self._iter_blocks_min(blocks):
+            start = 0
+            while True:
+                try:
+                    split_index = part.index('}', max(
+                        start, start + line_length - column)) + 1
+                except ValueError:
+                    break
+                yield part[start:split_index] + u'\n'
+                start = split_index
+                column = 0
+            column += len(part) - start
+            yield part[start:] if start else part
+
+    def _iter_blocks_min(self, blocks):
         current_media = None
-        for media, selectors, defs in self.evaluate(context):
+        for media, block in blocks:
             if media != current_media:
                 if current_media:
-                    parts.append('}')
+                    yield u'}'
                 if media:
-                    parts.append('@media %s{' % media)
+                    yield u'@media %s{' % media
                 current_media = media
-            parts.append(u''.join(u'%s{%s}' % (
-                    u','.join(selectors),
-                    u';'.join(u'%s:%s' % kv for kv in defs))))
+            yield block
         if current_media:
-            parts.append('}')
-        result = ''.join(parts)
+            yield u'}'
 
-        # Some browsers/editors choke on extremely long lines.
-        # Output lines of 2000 characters or more, broken after a closing brace
-        lines = []
-        try:
-            while True:
-                split_index = result.index('}', 2000) + 1
-                lines.append(result[:split_index])
-                result = result[split_index:]
-        except ValueError:
-            pass
-        lines.append(result)
+def _min_width(media):
+    # the min-width of a media query in pixels, assuming 16px per em
+    match = consts.regex['min_width'].search(media)
+    if match is None:
+        return None
+    value, unit = float(match.group(1)), match.group(2)
+    if unit != 'px':
+        value *= 16
+    return value
+
+
+def _iter_nodes(exprs):
+    """Iterate over the expressions in `exprs` and all of their children."""
+    todo = list(exprs)
+    while todo:
+        node = todo.pop()
+        yield node
+        todo.extend(node.iter_children())
+
+
+# nodes whose value doesn't depend on the context, not even on how the
+# output is formatted
+_arithmetic_nodes = (expressions.Bin, expressions.Neg, expressions.Number,
+                     expressions.Value, expressions.Color)
+
+
+def _is_arithmetic(expr):
+    """Whether `expr` is nothing but arithmetic on literals."""
+    return isinstance(expr, _arithmetic_nodes) and \
+        all(_is_arithmetic(node) for node in expr.iter_children())
+
+
+def group_media_blocks(blocks, mobile_first=False):
+    """
+    Reorder ``(media, block)`` pairs so that all blocks of a media query
+    are in one media block.  Blocks without media are passed on right away,
+    the media blocks follow them in the order their media first appeared,
+    each keeping the order of its blocks.  With `mobile_first` the queries
+    with a ``min-width`` come last, the narrowest first.
+    """
+    grouped = OrderedDict()
+    for media, block in blocks:
+        if media:
+            grouped.setdefault(media, []).append(block)
+        else:
+            yield media, block
+    order = list(grouped)
+    if mobile_first:
+        widths = dict((media, _min_width(media)) for media in order)
+        order = [media for media in order if widths[media] is None] + \
+            sorted((media for media in order if widths[media] is not None),
+                   key=widths.get)
+    for media in order:
+        for block in grouped[media]:
+            yield media, block
 
-        return '\n'.join(lines)
 
 class TokenStream(object):
     """
@@ -154,16 +515,17 @@ class Parser(object):
 
     sprite_map_cls = expressions.SpriteMap
 
-    def __init__(self, fname=None):
+    def __init__(self, fname=None, max_selectors=None):
         self.fname = fname
+        self.max_selectors = max_selectors
 
     def preparse(self, source):
         """
         Do the line wise parsing and resolve indents.
         """
-        rule = (None, [], [])
-        vars = {}
-        imports = OrderedDict({})
+        rule = (None, [], [], None)
+        vars = OrderedDict()
+        imports = OrderedDict()
         indention_stack = [0]
         state_stack = ['root']
         group_block_stack = []
@@ -239,16 +601,24 @@ class Parser(object):
 
                 # new rule blocks
                 elif line.endswith(','):
+                    if not sub_rules:
+                        rule_lineno = lineiter.lineno
                     sub_rules.append(line)
 
                 elif line.endswith(':'):
+                    if not sub_rules:
+                        rule_lineno = lineiter.lineno
                     sub_rules.append(line[:-1].rstrip())
                     s_rule = ' '.join(sub_rules)
                     sub_rules = []
                     if not s_rule:
                         fail('empty rule')
+                    if s_rule.startswith('for ') and \
+                       consts.regex['for_loop'].search(s_rule) is None:
+                        fail('invalid loop syntax, expected '
+                             '"for $name in start..end:"')
                     new_state = 'rule'
-                    new_rule = (s_rule, [], [])
+                    new_rule = (s_rule, [], [], rule_lineno)
                     rule[1].append(new_rule)
                     rule_stack.append(rule)
                     rule = new_rule
@@ -318,25 +688,102 @@ class Parser(object):
         """
         Create a flat structure and parse inline expressions.
         """
-        expand_def = lambda lineno_k_v: (lineno_k_v[1], self.parse_expr(lineno_k_v[0], lineno_k_v[2]))
+        root_rules, vars, imports, macroses = self.preparse(source)
+        result = self.compile(root_rules, macroses)
+
+        real_vars = OrderedDict()
+        for name, args in vars.items():
+            real_vars[name] = self.parse_expr(*args)
+
+        return result, real_vars, imports
+
+    def _expr(self, lineno, value):
+        if isinstance(value, expressions.Expr):
+            return value
+        return self.parse_expr(lineno, value)
+
+    def compile(self, root_rules, macroses=None):
+        """
+        Turn the rule tree of `preparse` into a `RuleTable`.  The values of
+        definitions are either source code or already parsed expressions.
+        """
+        def expand_def(definition):
+            lineno, key, value = definition
+            if not loop_values:
+                return key, self._expr(lineno, value)
+            # definitions in loops are parsed once, every iteration binds
+            # the loop variables in the parsed expression
+            expr = parsed.get(id(definition))
+            if expr is None:
+                expr = parsed[id(definition)] = self._expr(lineno, value)
+                references[id(definition)] = expr.variables()
+            names = references[id(definition)].intersection(loop_values)
+            if not names:
+                return key, expr
+            expr = expr.bind(dict((name, expressions.Number.intern(
+                loop_values[name])) for name in names))
+            if len(names) == len(references[id(definition)]) and \
+               _is_arithmetic(expr):
+                # arithmetic on nothing but the loop, compute it right away
+                try:
+                    expr = expr.evaluate({})
+                except EvalException:
+                    pass
+            return key, expr
         expand_defs = lambda it: list(map(expand_def, it))
 
-        def handle_rule(rule, children, defs, macroses):
+        def substitute(rule):
+            # loop variables in selectors and media queries
+            def replace(match):
+                name = match.group(1) or match.group(2)
+                if name in loop_values:
+                    return str(loop_values[name])
+                return match.group(0)
+            if not loop_values or '$' not in rule:
+                return rule
+            return consts.regex['var'].sub(replace, rule)
+
+        def handle_loop(loop, children, defs, lineno, macroses):
+            if defs:
+                raise ParserError(lineno, 'loops can only contain rules')
+            name = loop.group(1)
+            start, end = int(loop.group(2)), int(loop.group(3))
+            step = start <= end and 1 or -1
+            outer = loop_values.get(name)
+            for value in range(start, end + step, step):
+                loop_values[name] = value
+                for i_r, i_c, i_d, i_l in children:
+                    handle_rule(i_r, i_c, i_d, i_l, macroses)
+            if outer is None:
+                del loop_values[name]
+            else:
+                loop_values[name] = outer
+
+        def handle_rule(rule, children, defs, lineno, macroses):
             def recurse(macroses):
                 if defs:
                     styles = []
-                    for lineno, k, v in defs:
+                    calls = []
+                    for definition in defs:
+                        lineno, k, v = definition
                         if k == '__macros_call__':
                             macros_defs = macroses.get(v, None)
                             if macros_defs is None:
                                 raise ParserError(lineno, 'No macro with name "%s" is defined' % v)
+                            start = len(styles)
                             styles.extend(expand_defs(macros_defs))
+                            calls.append((v, start, len(styles)))
                         else:
-                            styles.append(expand_def((lineno, k, v)))
-                    result.append((media[-1], get_selectors(), styles))
-                for i_r, i_c, i_d in children:
-                    handle_rule(i_r, i_c, i_d, macroses)
-
+                            styles.append(expand_def(definition))
+                    result.append(media[-1], get_selectors(), styles, calls)
+                for i_r, i_c, i_d, i_l in children:
+                    handle_rule(i_r, i_c, i_d, i_l, macroses)
+
+            loop = consts.regex['for_loop'].search(rule)
+            if loop is not None:
+                handle_loop(loop, children, defs, lineno, macroses)
+                return
+            rule = substitute(rule)
             local_rules = []
             reference_rules = []
             if rule.startswith('@media '):
@@ -351,13 +798,13 @@ class Parser(object):
                         local_rules.append(r)
 
             if local_rules:
-                stack.append(local_rules)
+                push(local_rules, lineno)
                 recurse(macroses)
-                stack.pop()
+                pop()
 
             if reference_rules:
                 if stack:
-                    parent_rules = stack.pop()
+                    parent_rules, parent_group = pop()
                     push_back = True
                 else:
                     parent_rules = ['*']
@@ -366,37 +813,50 @@ class Parser(object):
                 for parent_rule in parent_rules:
                     for tmpl in reference_rules:
                         virtual_rules.append(tmpl.replace('&', parent_rule))
-                stack.append(virtual_rules)
+                push(virtual_rules, lineno)
                 recurse(macroses)
-                stack.pop()
+                pop()
                 if push_back:
                     stack.append(parent_rules)
+                    groups.append(parent_group)
 
             if rule.startswith('@media '):
                 del media[-1]
 
+        def push(level, lineno):
+            # every level extends the selector group of the enclosing one,
+            # the selectors are only expanded when the rules are read
+            if groups:
+                group = result.add_group(level, groups[-1])
+            else:
+                group = result.add_group(level)
+            size = result.group_sizes[group]
+            if self.max_selectors is not None and size > self.max_selectors:
+                raise ParserError(lineno, 'rule expands to %d selectors, '
+                                  'more than the limit of %d' %
+                                  (size, self.max_selectors))
+            stack.append(level)
+            groups.append(group)
+
+        def pop():
+            return stack.pop(), groups.pop()
+
         def get_selectors():
-            branches = [()]
-            for level in stack:
-                new_branches = []
-                for rule in level:
-                    for item in branches:
-                        new_branches.append(item + (rule,))
-                branches = new_branches
-            return [' '.join(branch) for branch in branches]
+            if not groups:
+                return result.add_group(())
+            return groups[-1]
 
-        root_rules, vars, imports, macroses = self.preparse(source)
-        result = []
+        result = RuleTable()
         stack = []
+        groups = []
         media = [None]
-        for i_r, i_c, i_d in root_rules:
-            handle_rule(i_r, i_c, i_d, macroses)
-
-        real_vars = {}
-        for name, args in vars.items():
-            real_vars[name] = self.parse_expr(*args)
-
-        return result, real_vars, imports
+        loop_values = {}
+        parsed = {}
+        references = {}
+        for i_r, i_c, i_d, i_l in root_rules:
+            handle_rule(i_r, i_c, i_d, i_l, macroses or {})
+        result.compact()
+        return result
 
     def parse_expr(self, lineno, s):
         def parse():
@@ -519,13 +979,13 @@ class Parser(object):
         value, token = stream.current
         if token == 'number':
             next(stream)
-            node = expressions.Number(value, lineno=stream.lineno)
+            node = expressions.Number.intern(value)
         elif token == 'value':
             next(stream)
-            node = expressions.Value(lineno=stream.lineno, *value)
+            node = expressions.Value.intern(*value)
         elif token == 'color':
             next(stream)
-            node = expressions.Color(value, lineno=stream.lineno)
+            node = expressions.Color.intern(value, lineno=stream.lineno)
         elif token == 'rgb':
             next(stream)
             if stream.current == ('(', 'op'):
@@ -558,7 +1018,8 @@ class Parser(object):
             node = expressions.String(value, lineno=stream.lineno)
         elif token == 'url':
             next(stream)
-            node = expressions.URL(value, lineno=stream.lineno)
+            node = expressions.URL(value, fname=self.fname,
+                                   lineno=stream.lineno)
         elif token == 'import':
             next(stream)
             node = expressions.Import(value, lineno=stream.lineno)
@@ -8,6 +8,9 @@ class CleverCssException(Exception):
         self.msg = message
         Exception.__init__(self, message)
 
+    def __reduce__(self):
+        return self.__class__, (self.lineno, self.msg)
+
     def __str__(self):
         return '%s (line %s)' % (
             self.msg,
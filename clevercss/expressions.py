@@ -1,17 +1,100 @@
 #!/usr/bin/env python
 
 import os
+import copy
+import colorsys
+import math
+import threading
 
 from clevercss import utils
 import operator
+from clevercss import assets
 from clevercss import consts
 from clevercss.errors import *
 
+#: maximum number of nodes kept in each pool of shared literals
+POOL_SIZE = 4096
+
+_numbers = {}
+_values = {}
+_colors = {}
+
+#: maximum number of color method results cached, the cache is emptied
+#: when it's full
+METHOD_CACHE_SIZE = 4096
+
+_method_cache = {}
+_method_stats = {'hits': 0, 'misses': 0}
+_method_lock = threading.Lock()
+
+
+def _set_lineno(exc, lineno):
+    """
+    Shared literal nodes don't know their line number.  Errors they raise
+    get the line number of the expression using them.
+    """
+    if exc.lineno is None:
+        exc.lineno = lineno
+
+
+def _internable(value):
+    # NaN is never equal to itself and -0.0 would be found as 0.0
+    return value == value and (value != 0 or math.copysign(1, value) > 0)
+
+
+def _method_key(node):
+    """
+    Return a hashable key for an argument of a color method, or `None` if
+    calls with that argument can't be cached.
+    """
+    if isinstance(node, Color):
+        return 'color', node._exact or node._rgb
+    elif isinstance(node, Value):
+        return 'value', node.value, node.unit
+    elif isinstance(node, Number):
+        return 'number', node.value
+    elif isinstance(node, Neg):
+        key = _method_key(node.node)
+        return key and ('neg', key)
+    elif isinstance(node, List):
+        keys = tuple(_method_key(item) for item in node.items)
+        if None not in keys:
+            return ('list',) + keys
+    return None
+
+
+def color_method_stats():
+    """
+    Return a dict with the number of `hits` and `misses` of the color
+    method cache, its current `size` and the `hit_rate`.
+    """
+    _method_lock.acquire()
+    try:
+        hits, misses = _method_stats['hits'], _method_stats['misses']
+    finally:
+        _method_lock.release()
+    return {'hits': hits, 'misses': misses, 'size': len(_method_cache),
+            'hit_rate': hits / float(hits + misses or 1)}
+
+
+def clear_color_method_cache():
+    """Empty the color method cache and reset its counters."""
+    _method_lock.acquire()
+    try:
+        _method_cache.clear()
+        _method_stats['hits'] = _method_stats['misses'] = 0
+    finally:
+        _method_lock.release()
+
+
 class Expr(object):
     """
-    Baseclass for all expressions.
+    Baseclass for all expressions.  Parsed stylesheets hold huge numbers of
+    expressions, so they use slots instead of a dict.
     """
 
+    __slots__ = ('lineno',)
+
     #: name for exceptions
     name = 'expression'
 
@@ -64,11 +147,64 @@ class Expr(object):
                                 (self.name, name))
         return self.methods[name](self, context, *args)
 
+    def _attributes(self):
+        """Iterate over ``(name, value)`` for all attributes of the node."""
+        for cls in self.__class__.__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                try:
+                    yield name, getattr(self, name)
+                except AttributeError:
+                    pass
+        for item in getattr(self, '__dict__', {}).items():
+            yield item
+
+    def iter_children(self):
+        """Iterate over the expressions this expression is made of."""
+        for name, value in self._attributes():
+            if isinstance(value, Expr):
+                yield value
+            elif isinstance(value, (list, tuple)):
+                for item in value:
+                    if isinstance(item, Expr):
+                        yield item
+
+    def variables(self):
+        """Return the names of all variables referenced in the expression."""
+        names = set()
+        for node in self.iter_children():
+            names.update(node.variables())
+        return names
+
+    def bind(self, values):
+        """
+        Return the expression with the variables named in the dict `values`
+        replaced by the expressions in it.  Parts of the expression that
+        don't refer to them are shared, not copied.
+        """
+        node = self
+        for name, value in self._attributes():
+            if isinstance(value, Expr):
+                bound = value.bind(values)
+                if bound is value:
+                    continue
+            elif isinstance(value, (list, tuple)):
+                bound = type(value)(
+                    item.bind(values) if isinstance(item, Expr) else item
+                    for item in value)
+                if all(a is b for a, b in zip(bound, value)):
+                    continue
+            else:
+                continue
+            if node is self:
+                node = copy.copy(self)
+            setattr(node, name, bound)
+        return node
+
     def __repr__(self):
         return '%s(%s)' % (
             self.__class__.__name__,
             ', '.join('%s=%r' % item for item in
-                      self.__dict__.items())
+                      self._attributes())
         )
 
 
@@ -76,6 +212,7 @@ class ImplicitConcat(Expr):
     """
     Holds multiple expressions that are delimited by whitespace.
     """
+    __slots__ = ('nodes',)
     name = 'concatenated'
     methods = {
         'list':     lambda x, c: List(x.nodes)
@@ -89,52 +226,61 @@ class ImplicitConcat(Expr):
         return u' '.join(x.to_string(context) for x in self.nodes)
 
 class Bin(Expr):
+    __slots__ = ('left', 'right')
+
+    #: name of the method implementing the operator
+    op = None
 
     def __init__(self, left, right, lineno=None):
         Expr.__init__(self, lineno)
         self.left = left
         self.right = right
 
-class Add(Bin):
-
     def evaluate(self, context):
-        return self.left.evaluate(context).add(
-               self.right.evaluate(context), context)
+        left = self.left.evaluate(context)
+        right = self.right.evaluate(context)
+        try:
+            return getattr(left, self.op)(right, context)
+        except EvalException as e:
+            _set_lineno(e, self.lineno)
+            raise
 
-class Sub(Bin):
+class Add(Bin):
+    __slots__ = ()
+    op = 'add'
 
-    def evaluate(self, context):
-        return self.left.evaluate(context).sub(
-               self.right.evaluate(context), context)
+class Sub(Bin):
+    __slots__ = ()
+    op = 'sub'
 
 class Mul(Bin):
-
-    def evaluate(self, context):
-        return self.left.evaluate(context).mul(
-               self.right.evaluate(context), context)
+    __slots__ = ()
+    op = 'mul'
 
 class Div(Bin):
-
-    def evaluate(self, context):
-        return self.left.evaluate(context).div(
-               self.right.evaluate(context), context)
+    __slots__ = ()
+    op = 'div'
 
 class Mod(Bin):
-
-    def evaluate(self, context):
-        return self.left.evaluate(context).mod(
-               self.right.evaluate(context), context)
+    __slots__ = ()
+    op = 'mod'
 
 class Neg(Expr):
+    __slots__ = ('node',)
 
     def __init__(self, node, lineno=None):
         Expr.__init__(self, lineno)
         self.node = node
 
     def evaluate(self, context):
-        return self.node.evaluate(context).neg(context)
+        try:
+            return self.node.evaluate(context).neg(context)
+        except EvalException as e:
+            _set_lineno(e, self.lineno)
+            raise
 
 class Call(Expr):
+    __slots__ = ('node', 'method', 'args')
 
     def __init__(self, node, method, args, lineno=None):
         Expr.__init__(self, lineno)
@@ -143,12 +289,19 @@ class Call(Expr):
         self.args = args
 
     def evaluate(self, context):
-        return self.node.evaluate(context) \
-                        .call(self.method, [x.evaluate(context)
-                                            for x in self.args],
-                              context)
+        node = self.node.evaluate(context)
+        args = [x.evaluate(context) for x in self.args]
+        try:
+            return node.call(self.method, args, context)
+        except EvalException as e:
+            _set_lineno(e, self.lineno)
+            raise
 
 class Literal(Expr):
+    __slots__ = ()
+
+    def bind(self, values):
+        return self
 
     def __init__(self, value, lineno=None):
         Expr.__init__(self, lineno)
@@ -164,47 +317,61 @@ class Literal(Expr):
         return rv
 
 class Number(Literal):
+    __slots__ = ('value',)
     name = 'number'
 
     methods = {
-        'abs':      lambda x, c: Number(abs(x.value)),
-        'round':    lambda x, c, p=0: Number(round(x.value, p))
+        'abs':      lambda x, c: Number.intern(abs(x.value)),
+        'round':    lambda x, c, p=0: Number.intern(round(x.value, p))
     }
 
     def __init__(self, value, lineno=None):
         Literal.__init__(self, float(value), lineno)
 
+    @classmethod
+    def intern(cls, value):
+        """
+        Return a number node for `value`.  Literals are never modified once
+        created, so nodes for frequent values are shared instead of created
+        again.  Shared nodes don't have a line number.
+        """
+        value = float(value)
+        if not _internable(value):
+            return cls(value)
+        node = _numbers.get(value)
+        if node is None:
+            node = cls(value)
+            if len(_numbers) < POOL_SIZE:
+                _numbers[value] = node
+        return node
+
     def add(self, other, context):
         if isinstance(other, Number):
-            return Number(self.value + other.value, lineno=self.lineno)
+            return Number.intern(self.value + other.value)
         elif isinstance(other, Value):
-            return Value(self.value + other.value, other.unit,
-                         lineno=self.lineno)
+            return Value.intern(self.value + other.value, other.unit)
         return Literal.add(self, other, context)
 
     def sub(self, other, context):
         if isinstance(other, Number):
-            return Number(self.value - other.value, lineno=self.lineno)
+            return Number.intern(self.value - other.value)
         elif isinstance(other, Value):
-            return Value(self.value - other.value, other.unit,
-                         lineno=self.lineno)
+            return Value.intern(self.value - other.value, other.unit)
         return Literal.sub(self, other, context)
 
     def mul(self, other, context):
         if isinstance(other, Number):
-            return Number(self.value * other.value, lineno=self.lineno)
+            return Number.intern(self.value * other.value)
         elif isinstance(other, Value):
-            return Value(self.value * other.value, other.unit,
-                         lineno=self.lineno)
+            return Value.intern(self.value * other.value, other.unit)
         return Literal.mul(self, other, context)
 
     def div(self, other, context):
         try:
             if isinstance(other, Number):
-                return Number(self.value / other.value, lineno=self.lineno)
+                return Number.intern(self.value / other.value)
             elif isinstance(other, Value):
-                return Value(self.value / other.value, other.unit,
-                             lineno=self.lineno)
+                return Value.intern(self.value / other.value, other.unit)
             return Literal.div(self, other, context)
         except ZeroDivisionError:
             raise EvalException(self.lineno, 'cannot divide by zero')
@@ -212,32 +379,46 @@ class Number(Literal):
     def mod(self, other, context):
         try:
             if isinstance(other, Number):
-                return Number(self.value % other.value, lineno=self.lineno)
+                return Number.intern(self.value % other.value)
             elif isinstance(other, Value):
-                return Value(self.value % other.value, other.unit,
-                             lineno=self.lineno)
+                return Value.intern(self.value % other.value, other.unit)
             return Literal.mod(self, other, context)
         except ZeroDivisionError:
             raise EvalException(self.lineno, 'cannot divide by zero')
 
     def neg(self, context):
-        return Number(-self.value)
+        return Number.intern(-self.value)
 
     def to_string(self, context):
         return utils.number_repr(self.value, context)
 
 class Value(Literal):
+    __slots__ = ('value', 'unit')
     name = 'value'
 
     methods = {
-        'abs':      lambda x, c: Value(abs(x.value), x.unit),
-        'round':    lambda x, c, p=0: Value(round(x.value, p), x.unit)
+        'abs':      lambda x, c: Value.intern(abs(x.value), x.unit),
+        'round':    lambda x, c, p=0: Value.intern(round(x.value, p), x.unit)
     }
 
     def __init__(self, value, unit, lineno=None):
         Literal.__init__(self, float(value), lineno)
         self.unit = unit
 
+    @classmethod
+    def intern(cls, value, unit):
+        """Return a shared value node, see `Number.intern`."""
+        value = float(value)
+        if not _internable(value):
+            return cls(value, unit)
+        key = value, unit
+        node = _values.get(key)
+        if node is None:
+            node = cls(value, unit)
+            if len(_values) < POOL_SIZE:
+                _values[key] = node
+        return node
+
     def add(self, other, context):
         return self._conv_calc(other, context, operator.add, Literal.add,
                                'cannot add %s and %s')
@@ -248,15 +429,13 @@ class Value(Literal):
 
     def mul(self, other, context):
         if isinstance(other, Number):
-            return Value(self.value * other.value, self.unit,
-                         lineno=self.lineno)
+            return Value.intern(self.value * other.value, self.unit)
         return Literal.mul(self, other, context)
 
     def div(self, other, context):
         if isinstance(other, Number):
             try:
-                return Value(self.value / other.value, self.unit,
-                             lineno=self.lineno)
+                return Value.intern(self.value / other.value, self.unit)
             except ZeroDivisionError:
                 raise EvalException(self.lineno, 'cannot divide by zero',
                                     lineno=self.lineno)
@@ -265,19 +444,17 @@ class Value(Literal):
     def mod(self, other, context):
         if isinstance(other, Number):
             try:
-                return Value(self.value % other.value, self.unit,
-                             lineno=self.lineno)
+                return Value.intern(self.value % other.value, self.unit)
             except ZeroDivisionError:
                 raise EvalException(self.lineno, 'cannot divide by zero')
         return Literal.mod(self, other, context)
 
     def _conv_calc(self, other, context, calc, fallback, msg):
         if isinstance(other, Number):
-            return Value(calc(self.value, other.value), self.unit)
+            return Value.intern(calc(self.value, other.value), self.unit)
         elif isinstance(other, Value):
             if self.unit == other.unit:
-                return Value(calc(self.value,other.value), other.unit,
-                             lineno=self.lineno)
+                return Value.intern(calc(self.value,other.value), other.unit)
             self_unit_type = consts.CONV_mapping.get(self.unit)
             other_unit_type = consts.CONV_mapping.get(other.unit)
             if not self_unit_type or not other_unit_type or \
@@ -288,57 +465,70 @@ class Value(Literal):
             self_unit = consts.CONV[self_unit_type][self.unit]
             other_unit = consts.CONV[other_unit_type][other.unit]
             if self_unit > other_unit:
-                return Value(calc(self.value / other_unit * self_unit,
-                                  other.value), other.unit,
-                             lineno=self.lineno)
-            return Value(calc(other.value / self_unit * other_unit,
-                              self.value), self.unit, lineno=self.lineno)
+                return Value.intern(calc(self.value / other_unit * self_unit,
+                                         other.value), other.unit)
+            return Value.intern(calc(other.value / self_unit * other_unit,
+                                     self.value), self.unit)
         return fallback(self, other, context)
 
     def neg(self, context):
-        return Value(-self.value, self.unit, lineno=self.lineno)
+        return Value.intern(-self.value, self.unit)
 
     def to_string(self, context):
+        if context.minified and self.value == 0 and \
+           self.unit in consts.LENGTH_UNITS:
+            return '0'
         return utils.number_repr(self.value, context) + self.unit
 
 class Color(Literal):
+    """
+    A color, given by name, hex code, channels or as packed integer.  The
+    channels are packed into a single integer, the bit above them is set
+    if the color was given by name.
+
+    The methods that work in HLS or HSV return colors that keep the exact
+    result in that form.  Chained calls continue from it, and the color is
+    rounded to RGB channels only when its value is needed.  The HLS and HSV
+    forms of a color are cached as well.
+    """
+    __slots__ = ('_rgb', '_exact', '_hls', '_hsv')
     name = 'color'
 
     def brighten(self, context, amount=None):
         if amount is None:
             amount = Value(10.0, '%')
-        hue, lightness, saturation = utils.rgb_to_hls(*self.value)
+        hue, lightness, saturation = self.hls
         if isinstance(amount, Value):
             if amount.unit == '%':
                 if not amount.value:
                     return self
                 lightness *= 1.0 + amount.value / 100.0
             else:
-                raise errors.EvalException(self.lineno, 'invalid unit %s for color '
+                raise EvalException(self.lineno, 'invalid unit %s for color '
                                     'calculations.' % amount.unit)
         elif isinstance(amount, Number):
             lightness += (amount.value / 100.0)
         if lightness > 1:
             lightness = 1.0
-        return Color(utils.hls_to_rgb(hue, lightness, saturation))
+        return Color.from_hls(hue, lightness, saturation)
 
     def darken(self, context, amount=None):
         if amount is None:
             amount = Value(10.0, '%')
-        hue, lightness, saturation = utils.rgb_to_hls(*self.value)
+        hue, lightness, saturation = self.hls
         if isinstance(amount, Value):
             if amount.unit == '%':
                 if not amount.value:
                     return self
                 lightness *= amount.value / 100.0
             else:
-                raise errors.EvalException(self.lineno, 'invalid unit %s for color '
+                raise EvalException(self.lineno, 'invalid unit %s for color '
                                     'calculations.' % amount.unit)
         elif isinstance(amount, Number):
             lightness -= (amount.value / 100.0)
         if lightness < 0:
             lightness = 0.0
-        return Color(utils.hls_to_rgb(hue, lightness, saturation))
+        return Color.from_hls(hue, lightness, saturation)
 
     def tint(self, context, lighten=None):
         """Specifies a relative value by which to lighten the color (e.g. toward
@@ -363,7 +553,7 @@ class Color(Literal):
             lighten = lighten.value
         lighten = abs(lighten) # Positive values only!
 
-        hue, lit, sat = utils.rgb_to_hls(*self.value)
+        hue, lit, sat = self.hls
 
         # Calculate relative lightness
         lavail = 1.0 - lit
@@ -373,9 +563,12 @@ class Color(Literal):
         # Corresponding relative (de-)saturation
         if lit == 0:
             lit = 1
-        snew = sat * (1 / (lnew/lit))
+        if lnew:
+            snew = sat * (1 / (lnew/lit))
+        else:
+            snew = sat # black, whatever the saturation
 
-        return Color(utils.hls_to_rgb(hue, lnew, snew))
+        return Color.from_hls(hue, lnew, snew)
 
     def shade(self, context, values=None):
         """Allows specification of an absolute saturation as well as a
@@ -418,7 +611,7 @@ class Color(Literal):
             if idx == 1:
                 saturation = value
 
-        hue, sat, val = utils.rgb_to_hsv(*self.value)
+        hue, sat, val = self.hsv
 
         # Calculate relative Value (referred to as lightness to avoid confusion)
         if lightness >= 0:
@@ -436,7 +629,7 @@ class Color(Literal):
             savail = sat
             snew = savail + (savail * (saturation / 100))
 
-        return Color(utils.hsv_to_rgb(hue, snew, lnew))
+        return Color.from_hsv(hue, snew, lnew)
 
 
     def mix(self, context, values=None):
@@ -501,7 +694,7 @@ class Color(Literal):
         gnew = ((g1 * (1-amount)) + (g2 * amount))
         bnew = ((b1 * (1-amount)) + (b2 * amount))
 
-        return Color((rnew, gnew, bnew))
+        return Color.intern((rnew, gnew, bnew))
 
     methods = {
         'brighten': brighten,
@@ -509,27 +702,134 @@ class Color(Literal):
         'tint':     tint,
         'shade':    shade,
         'mix':      mix,
-        'hex':      lambda x, c: Color(x.value, x.lineno)
+        'hex':      lambda x, c: Color.intern(x.value)
     }
 
+    def call(self, name, args, context):
+        """
+        Call a method.  The results of the color methods are cached for the
+        whole process, keyed by the color, the method and the arguments.
+        """
+        if name not in self.methods:
+            return Literal.call(self, name, args, context)
+        key = [name, _method_key(self)]
+        for arg in args:
+            key.append(_method_key(arg))
+            if key[-1] is None:
+                return Literal.call(self, name, args, context)
+        key = tuple(key)
+        result = _method_cache.get(key)
+        _method_lock.acquire()
+        try:
+            _method_stats['hits' if result is not None else 'misses'] += 1
+        finally:
+            _method_lock.release()
+        if result is None:
+            result = Literal.call(self, name, args, context)
+            if len(_method_cache) >= METHOD_CACHE_SIZE:
+                _method_cache.clear()
+            _method_cache[key] = result
+        return result
+
     def __init__(self, value, lineno=None):
-        self.from_name = False
+        Expr.__init__(self, lineno)
+        self._exact = self._hls = self._hsv = None
+        if value is None:
+            self._rgb = None
+        elif isinstance(value, str):
+            self._rgb = _parse_color(value, lineno)
+        elif isinstance(value, int):
+            self._rgb = value
+        else:
+            self._rgb = _pack_color(value)
+
+    @classmethod
+    def intern(cls, value, lineno=None):
+        """
+        Return a shared color node, see `Number.intern`.  Named colors come
+        from a prebuilt table, other colors from a bounded pool.  The line
+        number is only used for error messages about invalid colors.
+        """
         if isinstance(value, str):
-            if not value.startswith('#'):
-                value = consts.COLORS.get(value)
-                if not value:
-                    raise ParserError(lineno, 'unknown color name')
-                self.from_name = True
-            try:
-                if len(value) == 4:
-                    value = [int(x * 2, 16) for x in value[1:]]
-                elif len(value) == 7:
-                    value = [int(value[i:i + 2], 16) for i in range(1, 7, 2)]
-                else:
-                    raise ValueError()
-            except ValueError as e:
-                raise ParserError(lineno, 'invalid color value')
-        Literal.__init__(self, tuple(value), lineno)
+            node = _named_colors.get(value)
+            if node is not None:
+                return node
+            rgb = _parse_color(value, lineno)
+        else:
+            rgb = _pack_color(value)
+        node = _colors.get(rgb)
+        if node is None:
+            node = cls(rgb)
+            if len(_colors) < POOL_SIZE:
+                _colors[rgb] = node
+        return node
+
+    @classmethod
+    def from_hls(cls, hue, lightness, saturation, rgb=None):
+        """
+        Return a color given by hue, lightness and saturation (0-1).  If
+        the packed RGB value is already known it can be passed as `rgb`.
+        """
+        color = cls(None)
+        color._rgb = rgb
+        color._hls = hue, lightness, saturation
+        color._exact = 'hls', color._hls
+        return color
+
+    @classmethod
+    def from_hsv(cls, hue, saturation, value, rgb=None):
+        """Return a color given by hue, saturation and value, see `from_hls`."""
+        color = cls(None)
+        color._rgb = rgb
+        color._hsv = hue, saturation, value
+        color._exact = 'hsv', color._hsv
+        return color
+
+    def _channels(self):
+        # the exact red, green and blue in the range 0-1
+        if self._exact is not None:
+            space, values = self._exact
+            if space == 'hls':
+                return colorsys.hls_to_rgb(*values)
+            return colorsys.hsv_to_rgb(*values)
+        rgb = self._rgb
+        return (rgb >> 16 & 255) / 255.0, (rgb >> 8 & 255) / 255.0, \
+               (rgb & 255) / 255.0
+
+    def _packed(self):
+        rgb = self._rgb
+        if rgb is None:
+            rgb = self._rgb = _pack_color(channel * 255
+                                          for channel in self._channels())
+        return rgb
+
+    @property
+    def value(self):
+        rgb = self._packed()
+        return (rgb >> 16 & 255, rgb >> 8 & 255, rgb & 255)
+
+    @property
+    def from_name(self):
+        return bool(self._packed() >> 24)
+
+    @property
+    def hls(self):
+        """Hue, lightness and saturation in the range 0-1."""
+        if self._hls is None:
+            self._hls = colorsys.rgb_to_hls(*self._channels())
+        return self._hls
+
+    @property
+    def hsv(self):
+        """Hue, saturation and value in the range 0-1."""
+        if self._hsv is None:
+            self._hsv = colorsys.rgb_to_hsv(*self._channels())
+        return self._hsv
+
+    def _attributes(self):
+        yield 'lineno', self.lineno
+        yield 'value', self.value
+        yield 'from_name', self.from_name
 
     def add(self, other, context):
         if isinstance(other, (Color, Number)):
@@ -552,7 +852,7 @@ class Color(Literal):
         return Literal.div(self, other, context)
 
     def to_string(self, context):
-        code = '#%02x%02x%02x' % self.value
+        code = '#%06x' % (self._packed() & 0xffffff)
         if not context.minified:
             return self.from_name and consts.REV_COLORS.get(code) or code
         else:
@@ -580,12 +880,46 @@ class Color(Literal):
             elif new_val < 0:
                 new_val = 0
             channels.append(new_val)
-        return Color(tuple(channels), lineno=self.lineno)
+        return Color.intern(channels)
+
+def _pack_color(channels):
+    """Pack red, green and blue into one integer, rounded and clamped."""
+    rgb = 0
+    for channel in channels:
+        channel = int(round(channel))
+        if channel > 255:
+            channel = 255
+        elif channel < 0:
+            channel = 0
+        rgb = rgb << 8 | channel
+    return rgb
+
+
+def _parse_color(value, lineno=None):
+    """Parse a color name or hex code into a packed color."""
+    if not value.startswith('#'):
+        try:
+            return _named_rgb[value]
+        except KeyError:
+            raise ParserError(lineno, 'unknown color name')
+    digits = value[1:]
+    if len(digits) not in (3, 6) or digits.strip('0123456789abcdefABCDEF'):
+        raise ParserError(lineno, 'invalid color value')
+    if len(digits) == 3:
+        digits = ''.join(x * 2 for x in digits)
+    return int(digits, 16)
+
+
+_named_rgb = dict((name, _parse_color(code) | 1 << 24)
+                  for name, code in consts.COLORS.items())
+_named_colors = dict((name, Color(name)) for name in consts.COLORS)
+
 
 class RGB(Expr):
     """
     an expression that hopefully returns a Color object.
     """
+    __slots__ = ('rgb',)
 
     def __init__(self, rgb, lineno=None):
         Expr.__init__(self, lineno)
@@ -607,12 +941,13 @@ class RGB(Expr):
                 raise EvalException(self.lineno, 'rgb components must be in '
                                 'the range 0 to 255.')
             args.append(value)
-        return Color(args, lineno=self.lineno)
+        return Color.intern(args)
 
 class RGBA(RGB):
     """
     an expression for dealing w/ rgba colors
     """
+    __slots__ = ()
 
     def to_string(self, context):
         args = []
@@ -636,12 +971,18 @@ class RGBA(RGB):
                 raise EvalError(self.lineno, 'rgb components must be in '
                                 'the range 0 to 255.')
             args.append(value)
-        return 'rgba(%s)' % (', '.join(str(n) for n in args))
+        if not context.minified:
+            return 'rgba(%s)' % (', '.join(str(n) for n in args))
+        if len(args) == 4 and args[3] >= 1:
+            return Color.intern(args[:3]).to_string(context)
+        return 'rgba(%s)' % ','.join(utils.number_repr(float(n), context)
+                                     for n in args)
 
 class Backstring(Literal):
     """
     A string meant to be escaped directly to output.
     """
+    __slots__ = ('nodes',)
     name = "backstring"
 
     def __init__(self, nodes, lineno=None):
@@ -652,6 +993,7 @@ class Backstring(Literal):
         return str(self.nodes)
 
 class String(Literal):
+    __slots__ = ('value',)
     name = 'string'
 
     methods = {
@@ -670,22 +1012,41 @@ class String(Literal):
         return Literal.mul(self, other, context, lineno=self.lineno)
 
 class URL(Literal):
+    __slots__ = ('value', 'fname')
     name = 'URL'
     methods = {
         'length':   lambda x, c: Number(len(self.value))
     }
 
+    def __init__(self, value, fname=None, lineno=None):
+        Literal.__init__(self, value, lineno)
+        self.fname = fname
+
     def add(self, other, context):
-        return URL(self.value + other.to_string(context),
+        return URL(self.value + other.to_string(context), fname=self.fname,
                    lineno=self.lineno)
 
     def mul(self, other, context):
         if isinstance(other, Number):
-            return URL(self.value * int(other.value), lineno=self.lineno)
+            return URL(self.value * int(other.value), fname=self.fname,
+                       lineno=self.lineno)
         return Literal.mul(self, other, context)
 
     def to_string(self, context):
-        return 'url(%s)' % Literal.to_string(self, context)
+        node = self
+        value = self.value
+        limit = getattr(context, 'inline_limit', 0)
+        if limit:
+            value = assets.inline_url(value, self.fname, limit)
+            stats = getattr(context, 'stats', None)
+            if stats is not None and value != self.value:
+                assets.count_inlined(stats, value)
+        mode = getattr(context, 'fingerprint', None)
+        if mode and value == self.value:
+            value = assets.fingerprint_url(value, self.fname, mode)
+        if value != self.value:
+            node = URL(value, lineno=self.lineno)
+        return 'url(%s)' % Literal.to_string(node, context)
 
 class SpriteMap(Expr):
     name = 'SpriteMap'
@@ -708,13 +1069,18 @@ class SpriteMap(Expr):
         self.fname = fname
 
     def evaluate(self, context):
-        self.map_fpath = os.path.join(os.path.dirname(self.fname),
+        """
+        Return a copy of the sprite map bound to the mapping file.  The node
+        itself is part of the parsed stylesheet and stays untouched.
+        """
+        smap = copy.copy(self)
+        smap.map_fpath = os.path.join(os.path.dirname(self.fname),
                                       self.map_fname.to_string(context))
-        self.mapping = self.read_spritemap(self.map_fpath)
-        return self
+        smap.mapping = smap.read_spritemap(smap.map_fpath)
+        return smap
 
     def read_spritemap(self, fpath):
-        fo = open(fpath, "U")
+        fo = open(fpath)
         spritemap = {}
         try:
             for line in fo:
@@ -766,16 +1132,27 @@ class SpriteMap(Expr):
         else:
             return self.image_url
 
+    def get_sprite_path(self, sprite):
+        """
+        The image file of `sprite`.  The image of the map is looked up
+        relative to the stylesheet like a ``url()``.
+        """
+        if self.sprite_passthru_url:
+            return os.path.join(os.path.dirname(self.map_fpath), sprite.name)
+        return assets.local_path(self.image_url, self.fname)
+
     def annotate_used(self, sprite):
         pass
 
 class AnnotatingSpriteMap(SpriteMap):
     sprite_maps = []
+    _lock = threading.Lock()
 
     def __init__(self, *args, **kwds):
         SpriteMap.__init__(self, *args, **kwds)
         self._sprites_used = {}
-        self.sprite_maps.append(self)
+        with self._lock:
+            self.sprite_maps.append(self)
 
     def read_spritemap(self, fname):
         self.image_url = "<annotator>"
@@ -787,18 +1164,25 @@ class AnnotatingSpriteMap(SpriteMap):
     def get_sprite_url(self, sprite):
         return "<annotated %s>" % (sprite,)
 
+    def get_sprite_path(self, sprite):
+        return None
+
     def annotate_used(self, sprite):
-        self._sprites_used[sprite.name] = sprite
+        with self._lock:
+            self._sprites_used[sprite.name] = sprite
 
     @classmethod
     def all_used_sprites(cls):
-        for smap in cls.sprite_maps:
-            yield smap, list(smap._sprites_used.values())
+        with cls._lock:
+            sprite_maps = [(smap, list(smap._sprites_used.values()))
+                           for smap in cls.sprite_maps]
+        for smap, sprites in sprite_maps:
+            yield smap, sprites
 
 class Sprite(Expr):
     name = 'Sprite'
     methods = {
-        'url': lambda x, c: String("url(%s)" % x.spritemap.get_sprite_url(x)),
+        'url': lambda x, c: String("url(%s)" % x.get_url(c)),
         'position': lambda x, c: ImplicitConcat(x._pos_vals(c)),
         'height': lambda x, c: Value(x.height, "px"),
         'width': lambda x, c: Value(x.width, "px"),
@@ -840,28 +1224,86 @@ class Sprite(Expr):
         call_names = "x1", "y1", "x2", "y2"
         return [meths[n](self, context) for n in call_names]
 
-    def to_string(self, context):
+    def get_url(self, context):
+        """The URL of the image, fingerprinted if the context asks for it."""
         sprite_url = self.spritemap.get_sprite_url(self)
-        return "url(%s) -%dpx -%dpx" % (sprite_url, self.x1, self.y1)
+        mode = getattr(context, 'fingerprint', None)
+        if mode:
+            sprite_url = assets.fingerprint(
+                sprite_url, self.spritemap.get_sprite_path(self), mode)
+        return sprite_url
+
+    def to_string(self, context):
+        return "url(%s) -%dpx -%dpx" % (self.get_url(context), self.x1,
+                                        self.y1)
 
 class Var(Expr):
+    __slots__ = ('name',)
+
+    #: the variables currently being resolved, per thread.  Used to detect
+    #: circular references without touching the context.
+    _resolving = threading.local()
 
     def __init__(self, name, lineno=None):
         self.name = name
         self.lineno = lineno
 
     def evaluate(self, context):
+        return self._resolve(context, 'evaluate')
+
+    def to_string(self, context):
+        """
+        Variables that are output as custom properties are referenced with
+        ``var()``.  As long as there are any, references to other variables
+        are followed without evaluating them, so aliases of those variables
+        keep referencing the custom property.
+        """
+        custom_properties = getattr(context, 'custom_properties', None)
+        if not custom_properties:
+            return self.evaluate(context).to_string(context)
+        if self.name in custom_properties:
+            return 'var(--%s)' % self.name
+        return self._resolve(context, 'to_string')
+
+    def _resolve(self, context, method):
         if self.name not in context:
             raise EvalException(self.lineno, 'variable %s is not defined' %
                                 (self.name,))
-        val = context[self.name]
-        context[self.name] = FailingVar(self, self.lineno)
         try:
-            return val.evaluate(context)
+            resolving = self._resolving.names
+        except AttributeError:
+            resolving = self._resolving.names = set()
+        key = (id(context), self.name)
+        if key in resolving:
+            return FailingVar(self, self.lineno).evaluate(context)
+        resolving.add(key)
+        try:
+            return getattr(context[self.name], method)(context)
         finally:
-            context[self.name] = val
+            resolving.discard(key)
+
+    def variables(self):
+        return set([self.name])
+
+    def bind(self, values):
+        return values.get(self.name, self)
+
+class CustomProperty(Expr):
+    """
+    The value of a variable that is output as custom property, as used in
+    the generated ``:root`` rule.
+    """
+    __slots__ = ('var',)
+
+    def __init__(self, var, lineno=None):
+        Expr.__init__(self, lineno)
+        self.var = Var(var, lineno)
+
+    def to_string(self, context):
+        return self.var._resolve(context, 'to_string')
 
 class FailingVar(Expr):
+    __slots__ = ('var',)
 
     def __init__(self, var, lineno=None):
         Expr.__init__(self, lineno or var.lineno)
@@ -872,6 +1314,7 @@ class FailingVar(Expr):
                             'detected when resolving %s.' % (self.var.name,))
 
 class List(Expr):
+    __slots__ = ('items',)
     name = 'list'
 
     methods = {
@@ -900,6 +1343,8 @@ class List(Expr):
         return List(self.items + [other], lineno=self.lineno)
 
     def to_string(self, context):
+        if context.minified:
+            return u','.join(x.to_string(context) for x in self.items)
         return u', '.join(x.to_string(context) for x in self.items)
 
 # vim: et sw=4 sts=4
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+    Incremental rendering
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    Keeps the output of a stylesheet around and re-evaluates only the rules
+    that depend on variables changed in the context.  Useful if the same
+    stylesheet is rendered over and over with small context changes, e.g.
+    while a theme is edited::
+
+        renderer = IncrementalRenderer(Engine(source), {'accent': 'red'})
+        css = renderer.render()
+        css = renderer.render({'accent': '#369'})
+        changed = renderer.render({'accent': 'navy'}, changed_only=True)
+"""
+
+from clevercss import Context
+
+
+class IncrementalRenderer(object):
+    """
+    Renders an `Engine` and caches the generated block of every rule.  The
+    dependencies recorded by the engine decide which rules have to be
+    evaluated again when the context changes.
+    """
+
+    def __init__(self, engine, context=None):
+        self.engine = engine
+        if not isinstance(context, Context):
+            context = Context(context)
+        self.context = engine.parse_context(context)
+        self._rules = list(engine.iter_rules(self.context))
+        self._blocks = None
+
+    def _format(self, rule, context):
+        media, selectors, defs = self.engine.evaluate_rule(rule, context)
+        return media, self.engine.format_rule(media, selectors, defs,
+                                              self.context.minified)
+
+    def render(self, context_delta=None, changed_only=False):
+        """
+        Update the context with `context_delta` and return the CSS.  The
+        first call evaluates every rule, later calls only those depending on
+        the changed variables.  If `changed_only` is true only the rules
+        whose output changed are returned.
+        """
+        delta = self.engine.parse_context(context_delta)
+        self.context.update(delta)
+        context = self.engine.bind_context(self.context)
+
+        if self._blocks is None:
+            self._blocks = [self._format(rule, context)
+                            for rule in self._rules]
+            changed = range(len(self._blocks))
+        else:
+            # variables defined by the stylesheet can't be overridden
+            names = [key for key in delta if context[key] is delta[key]]
+            changed = []
+            for idx in self.engine.dependent_rules(names, context):
+                block = self._format(self._rules[idx], context)
+                if block != self._blocks[idx]:
+                    self._blocks[idx] = block
+                    changed.append(idx)
+
+        if changed_only:
+            blocks = [self._blocks[idx] for idx in changed]
+        else:
+            blocks = self._blocks
+        return self.engine.join_rules(blocks, self.context.minified,
+                                      self.context.line_length,
+                                      self.context.group_media)
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+"""
+    Optimizer
+    ~~~~~~~~~
+
+    An optional pass over the evaluated rules before they are formatted::
+
+        css = clevercss.convert(source, optimize=True)
+
+    It folds rules repeating the selectors of an earlier rule into that
+    rule, merges the selectors of rules with identical declarations, drops
+    declarations overridden later in the same rule and collapses the four
+    sides of ``margin`` and ``padding`` into the shorthand.
+
+    Rules are only ever moved up into an earlier rule and only if no rule
+    in between declares a property of the same family (``margin-top`` and
+    ``margin`` are one family, so are ``font`` and ``line-height`` it
+    resets), in any media, so the cascade stays the same.  ``all`` belongs
+    to every family.  The pass needs all rules at once, so optimized output is not
+    streamed rule by rule.
+
+    `group_macros` uses what the parser knows about macros: the
+    declarations of a macro called by many rules are output once for all
+    of them (``group_macros=True``).  `canonical_order` sorts declarations
+    and clusters similar rules so that the output compresses better
+    (``canonical_order=True``).
+"""
+
+import copy
+import re
+
+_vendor_re = re.compile(r'(?:^|[\s,(])-[a-z]+-')
+
+SHORTHANDS = {
+    'margin':  ('margin-top', 'margin-right', 'margin-bottom',
+                'margin-left'),
+    'padding': ('padding-top', 'padding-right', 'padding-bottom',
+                'padding-left')
+}
+_sides = dict((side, shorthand) for shorthand, sides in SHORTHANDS.items()
+              for side in sides)
+
+_global_values = frozenset(['inherit', 'initial', 'unset', 'revert'])
+
+# shorthands resetting properties of another family and aliases of
+# properties in another family join that family
+_shorthand_families = {
+    'line':     'font',
+    'top':      'inset',
+    'right':    'inset',
+    'bottom':   'inset',
+    'left':     'inset',
+    'align':    'place',
+    'justify':  'place',
+    'columns':  'column',
+    'row':      'gap',
+    'white':    'text',
+    'word':     'overflow'
+}
+
+
+def family(key):
+    """
+    The property family of `key`: the first part of the name without
+    vendor prefix, ``border`` for ``-moz-border-radius``.  Properties a
+    shorthand of another family resets belong to that family, ``font``
+    for ``line-height``, and so do aliases of a property, ``gap`` for
+    ``grid-gap``.
+    """
+    if key.startswith('-'):
+        key = key.split('-', 2)[-1]
+    name = key.split('-', 1)[0]
+    if name in ('column', 'grid') and key.endswith('-gap'):
+        return 'gap'
+    return _shorthand_families.get(name, name)
+
+
+def _overlap(families, other):
+    # whether two sets of families share one, ``all`` shares every one
+    return bool(families & other) or 'all' in families or 'all' in other
+
+
+def _declared_after(last_declared, families, target):
+    # whether a rule after `target` declares a property of `families`,
+    # `last_declared` maps families to the last rule declaring them
+    if 'all' in families:
+        return any(idx > target for idx in last_declared.values())
+    return any(last_declared.get(name, -1) > target
+               for name in families.union(['all']))
+
+
+def _overrides(value, earlier):
+    # a later declaration replaces an earlier one of the same property
+    # unless the earlier one is a fallback for browsers not understanding
+    # the later one or more important
+    if value == earlier:
+        return True
+    for text in (value, earlier):
+        if '!important' in text or '(' in text or _vendor_re.search(text):
+            return False
+    return True
+
+
+def dedupe(defs):
+    """Drop the declarations that are overridden later in `defs`."""
+    last = {}
+    for idx, (key, value) in enumerate(defs):
+        last.setdefault(key, []).append(idx)
+    dropped = set()
+    for key, indexes in last.items():
+        for pos, idx in enumerate(indexes[:-1]):
+            if any(_overrides(defs[later][1], defs[idx][1])
+                   for later in indexes[pos + 1:]):
+                dropped.add(idx)
+    if not dropped:
+        return defs
+    return [item for idx, item in enumerate(defs) if idx not in dropped]
+
+
+def _shorten(values):
+    # top right bottom left, then leave out what CSS fills in
+    if values[3] == values[1]:
+        values = values[:3]
+        if values[2] == values[0]:
+            values = values[:2]
+            if values[1] == values[0]:
+                values = values[:1]
+    return ' '.join(values)
+
+
+def collapse(defs):
+    """
+    Replace the four sides of a ``margin`` or ``padding`` by the shorthand,
+    at the place of the last of them.  Not if another property of the
+    family is declared between the sides, it would then come before a side
+    it came after.
+    """
+    found = {}
+    for idx, (key, value) in enumerate(defs):
+        shorthand = _sides.get(key)
+        if shorthand is not None:
+            found.setdefault(shorthand, {}).setdefault(key, []).append(idx)
+        elif key in SHORTHANDS:
+            found.setdefault(key, {})[key] = None
+    replaced = {}
+    for shorthand, sides in found.items():
+        if shorthand in sides or len(sides) != 4 or \
+           any(len(indexes) != 1 for indexes in sides.values()):
+            continue
+        indexes = [sides[side][0] for side in SHORTHANDS[shorthand]]
+        if any(family(key) == shorthand and key not in sides
+               for key, value in defs[min(indexes) + 1:max(indexes)]):
+            continue
+        values = [defs[idx][1] for idx in indexes]
+        if any(' ' in value or '(' in value or value in _global_values
+               for value in values):
+            continue
+        for idx in indexes:
+            replaced[idx] = None
+        replaced[max(indexes)] = shorthand, _shorten(values)
+    if not replaced:
+        return defs
+    result = []
+    for idx, item in enumerate(defs):
+        if idx in replaced:
+            item = replaced[idx]
+            if item is None:
+                continue
+        result.append(item)
+    return result
+
+
+def _mergeable(selectors):
+    # an unknown vendor pseudo class or element invalidates every selector
+    # of a rule, so those are not grouped with others
+    return not any(':-' in selector for selector in selectors)
+
+
+class _Rules(object):
+    """The optimized rules and the indexes needed to build them."""
+
+    def __init__(self):
+        self.rules = []
+        self.by_selectors = {}
+        self.by_body = {}
+        self.last_declared = {}
+
+    def _movable(self, target, defs):
+        # the declarations can move up to the rule at `target` if no later
+        # rule declares a property of the same family
+        return not _declared_after(self.last_declared,
+                                   set(family(key) for key, value in defs),
+                                   target)
+
+    def _index(self, idx):
+        media, selectors, defs = self.rules[idx]
+        self.by_selectors[media, tuple(selectors)] = idx
+        if _mergeable(selectors):
+            self.by_body[media, tuple(defs)] = idx
+        for key, value in defs:
+            name = family(key)
+            if self.last_declared.get(name, -1) < idx:
+                self.last_declared[name] = idx
+
+    def _unindex(self, idx):
+        media, selectors, defs = self.rules[idx]
+        for key, mapping in [((media, tuple(selectors)), self.by_selectors),
+                             ((media, tuple(defs)), self.by_body)]:
+            if mapping.get(key) == idx:
+                del mapping[key]
+
+    def add(self, media, selectors, defs):
+        defs = collapse(dedupe(defs))
+        target = self.by_selectors.get((media, tuple(selectors)))
+        if target is not None and self._movable(target, defs):
+            self._unindex(target)
+            old_defs = self.rules[target][2]
+            self.rules[target] = (media, selectors,
+                                  collapse(dedupe(old_defs + defs)))
+            self._index(target)
+            return
+        target = self.by_body.get((media, tuple(defs)))
+        if target is not None and _mergeable(selectors) and \
+           self._movable(target, defs):
+            self._unindex(target)
+            old_selectors = self.rules[target][1]
+            self.rules[target] = (media, old_selectors +
+                                  [selector for selector in selectors
+                                   if selector not in old_selectors], defs)
+            self._index(target)
+            return
+        self.rules.append((media, list(selectors), defs))
+        self._index(len(self.rules) - 1)
+
+
+def optimize(rules):
+    """
+    Optimize evaluated ``(media, selectors, defs)`` rules and return them
+    as a new list.
+    """
+    result = _Rules()
+    for media, selectors, defs in rules:
+        result.add(media, selectors, defs)
+    return result.rules
+
+
+def _split_macro_calls(engine, context):
+    # evaluate every rule in parts: ``(macro name, defs)`` for the
+    # definitions of a macro call, ``(None, defs)`` for the others
+    bound = engine.bind_context(context)
+    for rule, calls in engine.iter_macro_calls(context):
+        media, selectors, defs = rule
+        parts = []
+        end = 0
+        for name, start, stop in calls:
+            parts.append((None, defs[end:start]))
+            parts.append((name, defs[start:stop]))
+            end = stop
+        parts.append((None, defs[end:]))
+        yield media, selectors, [
+            (name, engine.evaluate_rule((media, selectors, part), bound)[2])
+            for name, part in parts if part]
+
+
+def group_macros(engine, context):
+    """
+    Evaluate the rules of `engine` and output the declarations of a macro
+    used by several rules once, in a rule with the selectors of all of
+    them at the place of the first.  The other declarations stay in their
+    rules.  If moving a call up to that rule could change the cascade, as
+    for `optimize`, the call starts a new group instead.  A call stays in
+    its rule if a declaration before it is of a property family the macro
+    sets as well.
+    """
+    rules = list(_split_macro_calls(engine, context))
+    counts = {}
+    for media, selectors, parts in rules:
+        for name, defs in parts:
+            if name is not None:
+                key = media, name, tuple(defs)
+                counts[key] = counts.get(key, 0) + 1
+
+    result = _Rules()
+    groups = {}
+    for media, selectors, parts in rules:
+        own = []
+        for name, defs in parts:
+            key = media, name, tuple(defs)
+            if name is None or counts[key] < 2 or \
+               not _mergeable(selectors):
+                own.extend(defs)
+                continue
+            families = set(family(k) for k, value in defs)
+            target, seen = groups.get(key, (None, None))
+            if _overlap(families, set(family(k) for k, value in own)):
+                own.extend(defs)
+            elif target is None or not result._movable(target, defs):
+                # later calls join the newest group
+                result.rules.append((media, list(selectors), defs))
+                groups[key] = len(result.rules) - 1, set(selectors)
+                result._index(len(result.rules) - 1)
+            else:
+                group_selectors = result.rules[target][1]
+                for selector in selectors:
+                    if selector not in seen:
+                        seen.add(selector)
+                        group_selectors.append(selector)
+        if own:
+            result.rules.append((media, selectors, own))
+            result._index(len(result.rules) - 1)
+    return result.rules
+
+
+def sort_declarations(defs):
+    """
+    Order declarations by property family, the same properties in the same
+    order in every rule help compression.  Declarations of one family keep
+    their order, a rule setting ``all`` is not touched.
+    """
+    if any(key == 'all' for key, value in defs):
+        return defs
+    return sorted(defs, key=lambda item: family(item[0]))
+
+
+def cluster(rules):
+    """
+    Move every rule up behind the last earlier rule declaring the same
+    properties in the same media, if no rule in between declares a
+    property of the same family.  Similar rules end up next to each other,
+    which helps compression.
+    """
+    clusters = []
+    by_signature = {}
+    last_declared = {}
+    for media, selectors, defs in rules:
+        families = set(family(key) for key, value in defs)
+        signature = media, tuple(key for key, value in defs)
+        target = by_signature.get(signature)
+        if target is None or \
+           _declared_after(last_declared, families, target):
+            target = len(clusters)
+            clusters.append([])
+            by_signature[signature] = target
+        clusters[target].append((media, selectors, defs))
+        for name in families:
+            if last_declared.get(name, -1) < target:
+                last_declared[name] = target
+    return [rule for rules in clusters for rule in rules]
+
+
+def canonical_order(rules):
+    """Sort the declarations of every rule and cluster similar rules."""
+    return cluster((media, selectors, sort_declarations(defs))
+                   for media, selectors, defs in rules)
+
+
+def process(engine, context, optimize_rules=None):
+    """
+    Evaluate the rules of `engine` and apply the passes the context asks
+    for: `group_macros`, `optimize` and `canonical_order`.  If
+    `optimize_rules` is not `None` it overrides ``context.optimize``.
+    """
+    if context.group_macros:
+        rules = group_macros(engine, context)
+    else:
+        rules = engine.evaluate(context)
+    if optimize_rules is None:
+        optimize_rules = context.optimize
+    if optimize_rules:
+        rules = optimize(rules)
+    if context.canonical_order:
+        rules = canonical_order(rules)
+    return rules
+
+
+def optimize_css(engine, context):
+    """
+    Generate the optimized CSS of `engine` and report what it saved.
+    Returns the CSS and a dict with the number of rules and declarations
+    and the UTF-8 encoded size before and after optimizing.
+    """
+    # only the optimized rules count in ``context.stats``
+    unoptimized = copy.copy(context)
+    unoptimized.stats = None
+    rules = list(engine.evaluate(unoptimized))
+    optimized = list(process(engine, context, True))
+    minified = context.minified
+
+    def render(rules):
+        return engine.join_rules(
+            ((media, engine.format_rule(media, selectors, defs, minified))
+             for media, selectors, defs in rules),
+            minified, context.line_length, context.group_media)
+
+    before = len(render(rules).encode('utf-8'))
+    css = render(optimized)
+    after = len(css.encode('utf-8'))
+    return css, {
+        'rules_before':         len(rules),
+        'rules_after':          len(optimized),
+        'declarations_before':  sum(len(defs) for m, s, defs in rules),
+        'declarations_after':   sum(len(defs) for m, s, defs in optimized),
+        'bytes_before':         before,
+        'bytes_after':          after,
+        'bytes_saved':          before - after
+    }
+
+# vim: et sw=4 sts=4
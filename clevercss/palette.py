@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+"""
+    Palettes
+    ~~~~~~~~
+
+    Generate whole color scales at once instead of one color method call
+    at a time, e.g. ten tints for each of forty brand colors::
+
+        from clevercss import palette
+
+        steps = [10, 20, 30, 40, 50, 60, 70, 80, 90]
+        tints = palette.tint(['#336699', 'orange'], steps)
+        context = palette.to_context(tints, ['brand', 'accent'], steps)
+        css = clevercss.convert(source, context)
+
+    Every function returns a list with one row of colors per input color
+    and one color per amount in each row.  The math is the same as that of
+    the color methods, so ``palette.darken(['red'], [20])[0][0]`` is the
+    same color as ``red.darken(20%)``.  If NumPy is installed the rows are
+    computed with arrays, otherwise the methods of `Color` are called.
+"""
+
+import colorsys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from clevercss.expressions import Color, List, Number, Value
+
+
+def _color(value):
+    if isinstance(value, Color):
+        return value
+    return Color.intern(value)
+
+
+def _shade_values(amount):
+    if isinstance(amount, (tuple, list)):
+        return amount
+    return amount, 0
+
+
+def _apply(method, colors, amounts, vectorized, *args):
+    colors = [_color(color) for color in colors]
+    amounts = list(amounts)
+    if vectorized is None:
+        vectorized = numpy is not None
+    if vectorized:
+        if numpy is None:
+            raise RuntimeError('vectorized palettes require NumPy')
+        return _vectorized[method](colors, amounts, *args)
+    return [[_methods[method](color, amount, *args) for amount in amounts]
+            for color in colors]
+
+
+def brighten(colors, amounts, vectorized=None):
+    """
+    Brighten every color by every amount in percent, like
+    ``color.brighten(amount%)``.  NumPy is used if `vectorized` is true,
+    not used if it's false and used if available if it's `None`.
+    """
+    return _apply('brighten', colors, amounts, vectorized)
+
+
+def darken(colors, amounts, vectorized=None):
+    """Darken every color by every amount in percent, like ``darken()``."""
+    return _apply('darken', colors, amounts, vectorized)
+
+
+def tint(colors, amounts, vectorized=None):
+    """Tint every color by every amount in percent, like ``tint()``."""
+    return _apply('tint', colors, amounts, vectorized)
+
+
+def shade(colors, amounts, vectorized=None):
+    """
+    Shade every color by every amount, like ``shade()``.  An amount is
+    either a ``(value, saturation)`` pair or just the value.
+    """
+    return _apply('shade', colors, amounts, vectorized)
+
+
+def mix(colors, other, amounts, vectorized=None):
+    """
+    Mix every color with the color `other` by every amount in percent,
+    like ``color.mix((amount%, other))``.
+    """
+    return _apply('mix', colors, amounts, vectorized, _color(other))
+
+
+def to_context(results, names, labels, pattern='%s_%s'):
+    """
+    Return a dict that can be passed as context to `convert`.  It has a
+    variable for every color in `results`, named by `pattern` after the
+    name of the input color and the label of the amount.
+    """
+    context = {}
+    for name, row in zip(names, results):
+        for label, color in zip(labels, row):
+            context[pattern % (name, label)] = color
+    return context
+
+
+_methods = {
+    'brighten': lambda color, amount: Color.brighten(
+        color, None, Value(amount, '%')),
+    'darken':   lambda color, amount: Color.darken(
+        color, None, Value(amount, '%')),
+    'tint':     lambda color, amount: Color.tint(color, None, Number(amount)),
+    'shade':    lambda color, amount: Color.shade(color, None, List(
+        [Number(value) for value in _shade_values(amount)])),
+    'mix':      lambda color, amount, other: Color.mix(color, None, List(
+        [Value(amount, '%'), other]))
+}
+
+
+# the NumPy versions of the color methods and of the conversions in
+# colorsys.  They do the same floating point operations in the same order
+# to get exactly the same results.
+
+def _hue_channel(m1, m2, hue):
+    hue = numpy.mod(hue, 1.0)
+    return numpy.select(
+        [hue < colorsys.ONE_SIXTH, hue < 0.5, hue < colorsys.TWO_THIRD],
+        [m1 + (m2 - m1) * hue * 6.0, m2,
+         m1 + (m2 - m1) * (colorsys.TWO_THIRD - hue) * 6.0], m1)
+
+
+def _hls_to_rgb(hue, lightness, saturation):
+    m2 = numpy.where(lightness <= 0.5, lightness * (1.0 + saturation),
+                     lightness + saturation - (lightness * saturation))
+    m1 = 2.0 * lightness - m2
+    grey = saturation == 0.0
+    return [numpy.where(grey, lightness, _hue_channel(m1, m2, hue + offset))
+            for offset in (colorsys.ONE_THIRD, 0.0, -colorsys.ONE_THIRD)]
+
+
+def _hsv_to_rgb(hue, saturation, value):
+    sector = (hue * 6.0).astype(numpy.int64)
+    f = (hue * 6.0) - sector
+    p = value * (1.0 - saturation)
+    q = value * (1.0 - saturation * f)
+    t = value * (1.0 - saturation * (1.0 - f))
+    sector = numpy.mod(sector, 6)
+    grey = saturation == 0.0
+    return [numpy.where(grey, value, numpy.choose(sector, choices))
+            for choices in ((value, q, p, p, t, value),
+                            (t, value, value, q, p, p),
+                            (p, p, t, value, value, q))]
+
+
+def _pack(channels, scale=255):
+    rgb = 0
+    for channel in channels:
+        channel = numpy.clip(numpy.round(channel * scale), 0, 255)
+        rgb = rgb << 8 | channel.astype(numpy.int64)
+    return rgb
+
+
+def _grid(colors, amounts, space):
+    # the channels of the colors in `space` as columns and the amounts as
+    # a row, operations on them give one row per color
+    values = numpy.array([getattr(color, space) for color in colors],
+                         dtype=float).reshape(len(colors), 3)
+    amounts = numpy.array(amounts, dtype=float).reshape(1, len(amounts))
+    shape = len(colors), amounts.shape[1]
+    return [numpy.broadcast_to(values[:, idx:idx + 1], shape)
+            for idx in range(3)] + [amounts]
+
+
+def _rows(make, *columns):
+    return [[make(*values) for values in zip(*row)]
+            for row in zip(*[column.tolist() for column in columns])]
+
+
+def _replace(rows, mask, replacements):
+    # where the color methods return a color unchanged
+    mask = mask.ravel().tolist()
+    for row, replacement in zip(rows, replacements):
+        for col, replace in enumerate(mask):
+            if replace:
+                row[col] = replacement
+    return rows
+
+
+def _from_hls(hue, lightness, saturation):
+    rgb = _pack(_hls_to_rgb(hue, lightness, saturation))
+    return _rows(Color.from_hls, hue, lightness, saturation, rgb)
+
+
+def _brighten(colors, amounts):
+    hue, lightness, saturation, amount = _grid(colors, amounts, 'hls')
+    lightness = lightness * (1.0 + amount / 100.0)
+    lightness = numpy.where(lightness > 1, 1.0, lightness)
+    return _replace(_from_hls(hue, lightness, saturation), amount == 0,
+                    colors)
+
+
+def _darken(colors, amounts):
+    hue, lightness, saturation, amount = _grid(colors, amounts, 'hls')
+    lightness = lightness * (amount / 100.0)
+    lightness = numpy.where(lightness < 0, 0.0, lightness)
+    return _replace(_from_hls(hue, lightness, saturation), amount == 0,
+                    colors)
+
+
+def _tint(colors, amounts):
+    hue, lightness, saturation, amount = _grid(colors, amounts, 'hls')
+    lighten = numpy.abs(amount)
+    lavail = 1.0 - lightness
+    lused = lavail - (lavail * (lighten / 100))
+    lnew = lused + (1.0 - lavail)
+    black = lnew == 0
+    snew = numpy.where(black, saturation, saturation * (1 / (
+        numpy.where(black, 1, lnew) / numpy.where(lightness == 0, 1,
+                                                  lightness))))
+    return _from_hls(hue, lnew, snew)
+
+
+def _shade(colors, amounts):
+    amounts = [_shade_values(amount) for amount in amounts]
+    hue, saturation, value, lightness = _grid(
+        colors, [amount[0] for amount in amounts], 'hsv')
+    desaturate = _grid(colors, [amount[1] for amount in amounts], 'hsv')[3]
+    lnew = numpy.where(lightness >= 0,
+                       value + ((1.0 - value) * (lightness / 100)),
+                       value + (value * (lightness / 100)))
+    snew = numpy.where(desaturate >= 0,
+                       saturation + ((1.0 - saturation) * (desaturate / 100)),
+                       saturation + (saturation * (desaturate / 100)))
+    rgb = _pack(_hsv_to_rgb(hue, snew, lnew))
+    return _rows(Color.from_hsv, hue, snew, lnew, rgb)
+
+
+def _mix(colors, amounts, other):
+    channels = _grid(colors, amounts, 'value')
+    amount = numpy.abs(channels.pop())
+    fraction = amount / 100.0
+    rgb = _pack([(channel * (1 - fraction)) + (value * fraction)
+                 for channel, value in zip(channels, other.value)], 1)
+    rows = _rows(lambda rgb: Color.intern(
+        (rgb >> 16 & 255, rgb >> 8 & 255, rgb & 255)), rgb)
+    _replace(rows, amount == 0, colors)
+    return _replace(rows, amount == 100, [other] * len(colors))
+
+
+_vectorized = {
+    'brighten': _brighten,
+    'darken':   _darken,
+    'tint':     _tint,
+    'shade':    _shade,
+    'mix':      _mix
+}
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+"""
+    Parallel evaluation
+    ~~~~~~~~~~~~~~~~~~~
+
+    Once a stylesheet is parsed and the variables are bound, the rules can
+    be evaluated independently of each other.  For very large stylesheets
+    this module splits evaluation and formatting of the rules across a pool
+    of worker processes.
+
+    The workers are forked, so they share the parsed stylesheet and the
+    bound context with the parent process and only the generated blocks
+    and the counts of inlined files are sent back.  Where forking is not available the rules are evaluated
+    in the current process.
+"""
+
+import copy
+import multiprocessing
+import threading
+
+from clevercss import assets
+
+#: rules per task sent to a worker if no chunk size is given
+DEFAULT_CHUNKSIZE = 2000
+
+# the state the forked workers operate on.  Set right before the pool is
+# created, the lock makes sure concurrent pools don't mix them up.
+_state = None
+_state_lock = threading.Lock()
+
+
+def _get_fork_context():
+    try:
+        return multiprocessing.get_context('fork')
+    except (AttributeError, ValueError):
+        return None
+
+
+def _call(item):
+    func, state = _state
+    return func(item, state)
+
+
+def imap(func, items, processes, state):
+    """
+    Call ``func(item, state)`` for every item in `processes` forked worker
+    processes and yield the results in order.  The workers inherit `state`
+    from the parent process, only items and results are pickled.
+    """
+    global _state
+    items = list(items)
+    mp_context = _get_fork_context()
+    if mp_context is None or not processes or processes < 2 or \
+       len(items) < 2:
+        for item in items:
+            yield func(item, state)
+        return
+
+    _state_lock.acquire()
+    try:
+        _state = func, state
+        pool = mp_context.Pool(min(processes, len(items)))
+    finally:
+        _state = None
+        _state_lock.release()
+    try:
+        for result in pool.imap(_call, items):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _format_chunk(bounds, state):
+    engine, context, rules, minified = state
+    if context.stats is not None:
+        # counted per chunk, the counts of a worker don't reach the parent
+        context = copy.copy(context)
+        context.stats = {}
+    blocks = []
+    for rule in rules[bounds[0]:bounds[1]]:
+        media, selectors, defs = engine.evaluate_rule(rule, context)
+        blocks.append((media, engine.format_rule(media, selectors, defs,
+                                                 minified)))
+    return blocks, context.stats
+
+
+def format_rules(engine, context, processes, minified=False, chunksize=None):
+    """
+    Evaluate and format the rules of `engine` in `processes` worker
+    processes and yield ``(media, block)`` pairs in the original order.
+    """
+    rules = list(engine.iter_rules(context))
+    context = engine.bind_context(context)
+    if chunksize is None:
+        chunksize = max(1, min(DEFAULT_CHUNKSIZE,
+                               len(rules) // (processes * 4) or 1))
+    bounds = [(start, start + chunksize)
+              for start in range(0, len(rules), chunksize)]
+    state = (engine, context, rules, minified)
+    for chunk, stats in imap(_format_chunk, bounds, processes, state):
+        if stats:
+            assets.add_stats(context.stats, stats)
+        for block in chunk:
+            yield block
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+"""
+    Rule table
+    ~~~~~~~~~~
+
+    Compact storage for the parsed rules of a stylesheet.  Instead of a
+    tuple with a list of selector strings and a list of definition tuples
+    per rule, the table keeps one column per field.  Media queries, selector
+    parts and property names are interned in string tables, and rules refer
+    to them by number in integer arrays.
+
+    Selectors are stored as factored groups: the selectors of a block are
+    the product of the selectors of the enclosing block and the comma
+    separated parts of the block itself.  Prefixes nested rules have in
+    common are stored only once, and the combinations are expanded to
+    strings only when the rules are read.
+
+    Iterating over the table or indexing it produces the same
+    ``(media, selectors, definitions)`` tuples the parser used to return.
+"""
+
+from array import array
+
+
+class StringTable(object):
+    """Assigns every distinct string a number."""
+
+    def __init__(self):
+        self.strings = []
+        self._index = None
+
+    def add(self, string):
+        """Return the number of `string`, adding it if it's new."""
+        if self._index is None:
+            self._index = dict((s, idx) for idx, s in enumerate(self.strings))
+        idx = self._index.get(string)
+        if idx is None:
+            idx = self._index[string] = len(self.strings)
+            self.strings.append(string)
+        return idx
+
+    def compact(self):
+        """Drop the lookup index, it's rebuilt when strings are added."""
+        self._index = None
+
+    def __getitem__(self, idx):
+        return self.strings[idx]
+
+    def __len__(self):
+        return len(self.strings)
+
+
+class RuleTable(object):
+    """
+    Column oriented storage of rules.  Rule ``n`` has the media query
+    ``media[rule_media[n]]`` (no media query if that's -1), the selectors
+    of the group ``rule_groups[n]`` and the definitions from
+    ``rule_definitions[n]`` up to the start of the next rule.
+    """
+
+    def __init__(self):
+        self.media = StringTable()
+        self.parts = StringTable()
+        self.properties = StringTable()
+        # the selector groups, every group is the group of the enclosing
+        # block combined with one more level of comma separated parts
+        self.levels = []
+        self.group_parents = array('l')
+        self.group_levels = array('l')
+        self.group_sizes = array('l')
+        self._level_index = None
+        self._group_index = None
+        # the rules
+        self.rule_media = array('l')
+        self.rule_groups = array('l')
+        self.rule_definitions = array('l')
+        self.definition_properties = array('l')
+        self.definition_values = []
+        # rule index -> ``(name, start, end)`` of every macro call, the
+        # offsets of the definitions it added to the rule
+        self.macro_calls = {}
+
+    def add_group(self, level, parent=-1):
+        """
+        Return the number of the selector group that combines the group
+        `parent` (-1 for the top level) with the selector parts in `level`.
+        The selectors are not expanded until they are needed.
+        """
+        if self._group_index is None:
+            self._level_index = dict((level, idx) for idx, level
+                                     in enumerate(self.levels))
+            self._group_index = dict(
+                (key, idx) for idx, key in
+                enumerate(zip(self.group_parents, self.group_levels)))
+        if parent < 0 and not level:
+            # rules outside of any block have an empty selector
+            level = ('',)
+        level = tuple(self.parts.add(part) for part in level)
+        level_id = self._level_index.get(level)
+        if level_id is None:
+            level_id = self._level_index[level] = len(self.levels)
+            self.levels.append(level)
+        key = parent, level_id
+        idx = self._group_index.get(key)
+        if idx is None:
+            idx = self._group_index[key] = len(self.group_parents)
+            self.group_parents.append(parent)
+            self.group_levels.append(level_id)
+            if parent < 0:
+                self.group_sizes.append(len(level))
+            else:
+                self.group_sizes.append(len(level) * self.group_sizes[parent])
+        return idx
+
+    def selectors(self, group, prefixes=None):
+        """
+        Expand the selector group number `group` to a list of strings.
+        `prefixes` caches the expanded parent groups, a dict shared by the
+        calls of one pass over the rules.
+        """
+        if prefixes is None:
+            prefixes = {}
+        strings = self.parts.strings
+        level = [strings[part] for part in self.levels[self.group_levels[group]]]
+        parent = self.group_parents[group]
+        if parent < 0:
+            return level
+        # the expanded parent groups are shared by many rules and smaller
+        # than the groups nested in them, they are only kept for one pass
+        expanded = prefixes.get(parent)
+        if expanded is None:
+            expanded = prefixes[parent] = self.selectors(parent, prefixes)
+        return [prefix + ' ' + part for part in level for prefix in expanded]
+
+    def expansion(self, idx):
+        """
+        Return the expansion factor of the selectors of rule `idx`: the
+        number of selectors it expands to divided by the number of selector
+        parts of the rule and the blocks it's nested in.
+        """
+        group = self.rule_groups[idx]
+        size = self.group_sizes[group]
+        parts = 0
+        while group >= 0:
+            parts += len(self.levels[self.group_levels[group]])
+            group = self.group_parents[group]
+        return size / float(parts)
+
+    def append(self, media, group, definitions, macro_calls=()):
+        """
+        Add a rule.  `group` is a selector group number as returned by
+        `add_group`, `definitions` are ``(property, expression)`` pairs and
+        `macro_calls` says which of them were added by which macro.
+        """
+        if macro_calls:
+            self.macro_calls[len(self)] = tuple(macro_calls)
+        self.rule_media.append(-1 if media is None else self.media.add(media))
+        self.rule_groups.append(group)
+        self.rule_definitions.append(len(self.definition_values))
+        for key, expr in definitions:
+            self.definition_properties.append(self.properties.add(key))
+            self.definition_values.append(expr)
+
+    def compact(self):
+        """
+        Drop the indices used to intern strings and selectors.  They are
+        only needed while rules are added and rebuilt if more are.
+        """
+        self._level_index = None
+        self._group_index = None
+        self.media.compact()
+        self.parts.compact()
+        self.properties.compact()
+
+    def __len__(self):
+        return len(self.rule_media)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('rule index out of range')
+        return self._rule(idx, idx + 1 < len(self))
+
+    def _rule(self, idx, has_next, prefixes=None):
+        media = self.rule_media[idx]
+        if has_next:
+            definitions = range(self.rule_definitions[idx],
+                                self.rule_definitions[idx + 1])
+        else:
+            definitions = range(self.rule_definitions[idx],
+                                len(self.definition_values))
+        properties = self.properties.strings
+        return (None if media < 0 else self.media[media],
+                self.selectors(self.rule_groups[idx], prefixes),
+                [(properties[self.definition_properties[n]],
+                  self.definition_values[n]) for n in definitions])
+
+    def __iter__(self):
+        count = len(self)
+        prefixes = {}
+        for idx in range(count):
+            yield self._rule(idx, idx + 1 < count, prefixes)
+
+# vim: et sw=4 sts=4
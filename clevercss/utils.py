@@ -1,23 +1,48 @@
 #!/usr/bin/env python
 
 import colorsys
+import re
+
+_selector_re = re.compile(r'''"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|'''
+                          r'''(\s*[>+~]\s*)|\s+''')
 
 def number_repr(value, context):
     """
     CleverCSS uses floats internally.  To keep the string representation
     of the numbers small cut off the places if this is possible without
-    losing much information.
+    losing much information.  Minified numbers lose the zero before the
+    decimal point as well.
     """
     value = str(value)
     integer, dot, fraction = value.partition('.')
     if dot and fraction == '0':
+        if integer == '-0' and context.minified:
+            return '0'
         return integer
     elif context.minified:
+        if integer == '-0':
+            return '-.' + fraction
         return value.lstrip('0')
     else:
         return value
 
 
+def _minify_selector_part(match):
+    if match.group(1) is not None:
+        return match.group(1).strip()
+    if match.group(0)[0] in '"\'':
+        return match.group(0)
+    return ' '
+
+
+def minify_selector(selector):
+    """
+    Remove the whitespace around the combinators ``>``, ``+`` and ``~`` of
+    a selector and collapse other whitespace, quoted strings are kept.
+    """
+    return _selector_re.sub(_minify_selector_part, selector.strip())
+
+
 def rgb_to_hls(red, green, blue):
     """
     Convert RGB to HSL.  The RGB values we use are in the range 0-255, but
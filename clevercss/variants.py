@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+    Variants
+    ~~~~~~~~
+
+    Render one stylesheet with many different contexts, e.g. one per brand
+    or theme.  The stylesheet is parsed once, and rules that don't depend on
+    any of the variables the variants set are evaluated only once and shared
+    between all variants.
+"""
+
+import copy
+from sys import version_info
+if version_info >= (2, 7):
+    from collections import OrderedDict
+else:
+    from ordereddict import OrderedDict
+
+from clevercss import assets
+from clevercss import parallel
+
+
+def _render_variant(name, state):
+    (engine, base, variants, rules, blocks, specific, minified,
+     line_length, group_media) = state
+    context = copy.copy(base)
+    context.update(variants[name])
+    if context.stats is not None:
+        context.stats = {}
+    context = engine.bind_context(context)
+    blocks = list(blocks)
+    for idx in specific:
+        media, selectors, defs = engine.evaluate_rule(rules[idx], context)
+        blocks[idx] = media, engine.format_rule(media, selectors, defs,
+                                                minified)
+    return (engine.join_rules(blocks, minified, line_length, group_media),
+            context.stats)
+
+
+def render_variants(engine, variants, context):
+    """
+    Render `engine` once for every variant and return an ordered dict
+    mapping variant names to CSS.  `variants` maps names to contexts that
+    are applied on top of `context`, which also decides about minification
+    and the number of processes used to render the variants.  The data
+    URIs of the shared rules are counted in ``context.stats`` once for
+    every variant.
+    """
+    base = engine.parse_context(context)
+    if context.stats is not None:
+        base.stats = {}
+    variants = OrderedDict((name, engine.parse_context(values))
+                           for name, values in variants.items())
+    names = set()
+    for values in variants.values():
+        names.update(values)
+    specific = set()
+    for values in variants.values():
+        variant_context = copy.copy(base)
+        variant_context.update(values)
+        specific.update(engine.dependent_rules(names, variant_context))
+    specific = sorted(specific)
+
+    # everything else is the same for all variants
+    rules = list(engine.iter_rules(base))
+    shared_context = engine.bind_context(base)
+    skip = set(specific)
+    blocks = []
+    for idx, rule in enumerate(rules):
+        if idx in skip:
+            blocks.append(None)
+            continue
+        media, selectors, defs = engine.evaluate_rule(rule, shared_context)
+        blocks.append((media, engine.format_rule(media, selectors, defs,
+                                                 context.minified)))
+
+    state = (engine, base, variants, rules, blocks, specific,
+             context.minified, context.line_length, context.group_media)
+    results = OrderedDict()
+    for name, (css, stats) in zip(variants, parallel.imap(
+            _render_variant, variants, context.processes, state)):
+        results[name] = css
+        if stats is not None:
+            assets.add_stats(context.stats, base.stats)
+            assets.add_stats(context.stats, stats)
+    return results
+
+# vim: et sw=4 sts=4
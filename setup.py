@@ -26,6 +26,9 @@ setup(
     description='python inspired sass-like css preprocessor',
     long_description=readme_text,
     install_requires = req_modules,
+    extras_require = {
+        'palette': ['numpy']
+    },
     entry_points = {
         'console_scripts': ['ccss = clevercss.ccss:main']
     },
@@ -7,8 +7,25 @@ from tests import ccss_to_css
 from tests import minify
 from tests import spritemap_test
 from tests import mediatype
+from tests import concurrency
+from tests import incremental
+from tests import parallel
+from tests import variants
+from tests import custom_properties
+from tests import literals
+from tests import ruletable
+from tests import palette
+from tests import loops
+from tests import builder
+from tests import streaming
+from tests import optimizer
+from tests import assets
+from tests import command
 
 def all_tests():
     return unittest.TestSuite(getattr(mod, 'all_tests')() for mod in [color_convert,
-        ccss_to_css, minify, spritemap_test, mediatype])
+        ccss_to_css, minify, spritemap_test, mediatype,
+        concurrency, incremental, parallel, variants, custom_properties,
+        literals, ruletable, palette, loops, builder,
+        streaming, optimizer, assets, command])
 
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from clevercss import convert, convert_to, convert_variants, _make_context
+from clevercss import assets
+from clevercss import optimizer
+from clevercss.engine import Engine
+
+source = '''a:
+  background: url(img/logo.png) url("img/logo.png?x=1#top")
+  cursor: url(http://example.com/logo.png) url(/logo.png) url(gone.png)
+'''
+
+class FingerprintTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, 'img'))
+        self.image = os.path.join(self.root, 'img', 'logo.png')
+        self._write_image(b'logo')
+        self.fname = os.path.join(self.root, 'style.ccss')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write_image(self, data):
+        fileobj = open(self.image, 'wb')
+        try:
+            fileobj.write(data)
+        finally:
+            fileobj.close()
+
+    def fingerprinted_urls(self):
+        digest = assets.hash_file(self.image)
+        self.assertEqual(len(digest), 10)
+        self.assertEqual(convert(source, fname=self.fname, minified=True,
+                                 fingerprint='name'),
+            'a{background:url(img/logo.%s.png) url("img/logo.%s.png?x=1#top");'
+            'cursor:url(http://example.com/logo.png) url(/logo.png) '
+            'url(gone.png)}' % (digest, digest))
+        self.assertEqual(convert(source, fname=self.fname, minified=True,
+                                 fingerprint='query'),
+            'a{background:url(img/logo.png?v=%s) url("img/logo.png?x=1&v=%s'
+            '#top");cursor:url(http://example.com/logo.png) url(/logo.png) '
+            'url(gone.png)}' % (digest, digest))
+        self.assertEqual(convert(source, fname=self.fname),
+                         convert(source, fname=self.fname, fingerprint=None))
+
+    def cached_digests(self):
+        digest = assets.file_digest(self.image)
+        self.assertEqual(assets.file_digest(self.image), digest)
+        self._write_image(b'new logo')
+        stat = os.stat(self.image)
+        os.utime(self.image, (stat.st_atime, stat.st_mtime + 10))
+        self.assertNotEqual(assets.file_digest(self.image), digest)
+        self.assertEqual(assets.file_digest(self.image),
+                         assets.hash_file(self.image))
+
+    def fingerprinted_sprites(self):
+        shutil.copy('tests/example_sprites.ccss', self.root)
+        shutil.copy('tests/example.sprites', self.root)
+        image = os.path.join(self.root, 'big.png')
+        fileobj = open(image, 'wb')
+        try:
+            fileobj.write(b'sprites')
+        finally:
+            fileobj.close()
+        fname = os.path.join(self.root, 'example_sprites.ccss')
+        source = open(fname).read() + '    a:\n        icon: $two.url()\n'
+        css = convert(source, fname=fname, fingerprint='name')
+        digest = assets.hash_file(image)
+        self.assertTrue('url(big.%s.png) -0px -20px' % digest in css)
+        self.assertTrue('icon: url(big.%s.png);' % digest in css)
+
+    def inlined_urls(self):
+        svg = os.path.join(self.root, 'img', 'dot.svg')
+        fileobj = open(svg, 'wb')
+        try:
+            fileobj.write(b'<svg xmlns="http://www.w3.org/2000/svg"/>')
+        finally:
+            fileobj.close()
+        stats = {}
+        css = convert('''a:
+          background: url(img/logo.png) url(img/dot.svg)
+          cursor: url(img/dot.svg#x) url(gone.png) url(data:,x)
+        ''', fname=self.fname, minified=True, inline_limit=64, stats=stats)
+        self.assertEqual(css,
+            'a{background:url(data:image/png;base64,bG9nbw==) '
+            'url(data:image/svg+xml,%3Csvg%20xmlns=%22http://www.w3.org/'
+            '2000/svg%22/%3E);cursor:url(img/dot.svg#x) url(gone.png) '
+            'url(data:,x)}')
+        # the data URI of the source isn't counted
+        self.assertEqual(stats, {'data_uris': 2, 'data_uri_bytes': 100})
+        # too big to inline, fingerprinted instead
+        self.assertEqual(convert('a:\n  b: url(img/logo.png)',
+                                 fname=self.fname, minified=True,
+                                 inline_limit=4, fingerprint='query'),
+                         'a{b:url(img/logo.png?v=%s)}' %
+                         assets.hash_file(self.image))
+
+    def inlined_counts(self):
+        source = 'a:\n  b: url(img/logo.png)\n' * 30
+        size = len(assets.data_uri(self.image))
+        expected = {'data_uris': 30, 'data_uri_bytes': 30 * size}
+        for options in [{}, {'processes': 2}, {'optimize': True}]:
+            stats = {}
+            convert(source, fname=self.fname, inline_limit=64, stats=stats,
+                    **options)
+            self.assertEqual(stats, expected)
+        stats = {}
+        convert_to(StringIO(), source, fname=self.fname, inline_limit=64,
+                   stats=stats)
+        self.assertEqual(stats, expected)
+        # the shared rules count once for every variant
+        stats = {}
+        convert_variants(source + 'c:\n  d: $icon\n',
+                         {'one': {'icon': 'url(img/logo.png)'},
+                          'two': {'icon': 'url(gone.png)'}},
+                         fname=self.fname, inline_limit=64, stats=stats,
+                         processes=2)
+        self.assertEqual(stats, {'data_uris': 61,
+                                 'data_uri_bytes': 61 * size})
+        # the unoptimized rules the report compares with aren't counted
+        stats = {}
+        optimizer.optimize_css(Engine(source, fname=self.fname),
+                               _make_context(inline_limit=64, stats=stats))
+        self.assertEqual(stats, expected)
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [FingerprintTestCase])
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+from textwrap import dedent
+
+from clevercss import convert
+from clevercss.builder import Stylesheet
+from clevercss.expressions import Call, Color, Mul, Number, Value, Var
+from clevercss.errors import *
+
+def build():
+    sheet = Stylesheet()
+    sheet.variable('accent', Color('#336699'))
+    with sheet.rule('ul#comments, ol#comments') as comments:
+        comments.define('margin', 0)
+        with comments.rule('li') as item:
+            item.define('color', Call(Var('accent'), 'brighten', []))
+            item.define('width', Mul(Var('columns'), Value(2, 'em')))
+        comments.rule(['&:hover', 'p']).define('border', '1px solid red')
+    with sheet.media('print') as media:
+        media.rule('#nav').define('display', 'none')
+    return sheet
+
+source = dedent('''
+    accent = #336699
+    ul#comments, ol#comments:
+        margin: 0
+        li:
+            color: $accent.brighten()
+            width: $columns * 2em
+        &:hover, p:
+            border: `1px solid red`
+    @media print:
+        #nav:
+            display: none
+    ''')
+
+class BuilderTestCase(TestCase):
+    def same_as_source(self):
+        sheet = build()
+        for context in [{'columns': '3'}, {'columns': 3},
+                        {'columns': Number(3)}]:
+            for minified in (False, True):
+                self.assertEqual(sheet.to_css(context, minified=minified),
+                                 convert(source, {'columns': '3'},
+                                         minified=minified))
+
+    def same_options(self):
+        sheet = build()
+        for options in [dict(minified=True, line_length=10),
+                        dict(optimize=True, group_media='mobile-first'),
+                        dict(canonical_order=True, custom_properties=['x'])]:
+            self.assertEqual(sheet.to_css({'columns': 3, 'x': '1px'},
+                                          **options),
+                             convert(source, {'columns': '3', 'x': '1px'},
+                                     **options))
+
+    def context_nodes(self):
+        sheet = Stylesheet()
+        sheet.rule('a').define('color', Var('link')) \
+                       .define('padding', Var('gap'))
+        self.assertEqual(sheet.to_css({'link': Color('red'),
+                                       'gap': Value(1.5, 'px')}),
+                         'a {\n  color: red;\n  padding: 1.5px;\n}')
+
+    def errors(self):
+        sheet = Stylesheet()
+        self.assertRaises(TypeError, sheet.variable, 'flag', True)
+        sheet.rule('a, b').rule('c, d').define('margin', 0)
+        self.assertRaises(ParserError, sheet.engine, max_selectors=3)
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [BuilderTestCase])
+
+# vim: et sw=4 sts=4
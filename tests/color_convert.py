@@ -5,6 +5,9 @@ from unittest import main
 from tests.magictest import MagicTest as TestCase
 
 from clevercss.utils import rgb_to_hls, hls_to_rgb
+from clevercss import convert
+from clevercss.expressions import Color, Value, color_method_stats, \
+     clear_color_method_cache
 
 class RgbToHlsTestCase(TestCase):
 
@@ -56,7 +59,59 @@ class HlsRgbFuzzyTestCase(TestCase):
         rgb2hls = rgb_to_hls(*hls2rgb)
         self.assertEqual(rgb2hls, hls)
 
+class ColorNodeTestCase(TestCase):
+    def packed_channels(self):
+        color = Color('#0a64fa')
+        self.assertEqual(color.value, (10, 100, 250))
+        self.assertFalse(color.from_name)
+        self.assertTrue(Color('khaki').from_name)
+        self.assertFalse(hasattr(color, '__dict__'))
+        self.assertFalse(hasattr(Value(1, 'px'), '__dict__'))
+
+    def rounded_and_clamped(self):
+        self.assertEqual(Color((127.5, -3, 300)).value, (128, 0, 255))
+
+    def repr_attributes(self):
+        self.assertEqual(repr(Color('red', lineno=3)),
+                         'Color(lineno=3, value=(255, 0, 0), from_name=True)')
+        self.assertEqual(repr(Value(1, 'px')),
+                         "Value(value=1.0, unit='px', lineno=None)")
+
+    def mix_rounds_channels(self):
+        self.assertEqual(convert('a:\n  color: red.mix((50%, blue))\n'),
+                         'a {\n  color: #800080;\n}')
+
+    def cached_hls_and_hsv(self):
+        color = Color('#0a64fa')
+        self.assertTrue(color.hls is color.hls)
+        self.assertAlmostEqual(color.hsv[2], 250 / 255.0)
+        self.assertEqual(Color.from_hls(*color.hls).value, (10, 100, 250))
+        self.assertEqual(Color.from_hsv(*color.hsv).value, (10, 100, 250))
+
+    def chains_round_once(self):
+        # rounding the dark intermediate color used to lose the hue
+        self.assertEqual(convert('a:\n  color: #65fbf4.brighten(45%)'
+                                 '.darken(24%).tint(20%)\n'),
+                         'a {\n  color: #cee3e2;\n}')
+        self.assertEqual(convert('a:\n  color: #fff.darken(50%)'
+                                 '.brighten(100%)\n'),
+                         'a {\n  color: #ffffff;\n}')
+
+    def method_cache(self):
+        clear_color_method_cache()
+        source = ('a:\n  color: #123456.darken(10%)\n'
+                  '  b: #123456.darken(10%) #123456.darken(20%)\n'
+                  '  c: #123456.mix((50%, $other))\n')
+        self.assertEqual(convert(source, {'other': 'red'}),
+                         convert(source, {'other': 'red'}))
+        stats = color_method_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (4, 2))
+        self.assertEqual(convert(source, {'other': 'blue'}).splitlines()[3],
+                         '  c: #091aaa;')
+        clear_color_method_cache()
+        self.assertEqual(color_method_stats()['size'], 0)
+
 def all_tests():
-    return unittest.TestSuite(case.toSuite() for case in [RgbToHlsTestCase, HlsRgbFuzzyTestCase, HlsToRgbTestCase])
+    return unittest.TestSuite(case.toSuite() for case in [RgbToHlsTestCase, HlsRgbFuzzyTestCase, HlsToRgbTestCase, ColorNodeTestCase])
 
 # vim: et sw=4 sts=4
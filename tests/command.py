@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+from io import StringIO
+from optparse import Values
+
+from clevercss import ccss
+
+class CommandTestCase(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write(self, fname, data):
+        fileobj = open(os.path.join(self.root, fname), 'wb')
+        try:
+            fileobj.write(data)
+        finally:
+            fileobj.close()
+        return os.path.join(self.root, fname)
+
+    def _read(self, fname):
+        fileobj = open(fname, 'rb')
+        try:
+            return fileobj.read()
+        finally:
+            fileobj.close()
+
+    def _quiet(self, function, *args):
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            return function(*args)
+        finally:
+            sys.stdout = stdout
+
+    def gzipped(self):
+        css = b'a {\n  color: red;\n}\n' * 100
+        target = self._write('style.css', css)
+        self.assertEqual(ccss.write_gzip(target),
+                         (len(css), os.path.getsize(target + '.gz')))
+        fileobj = gzip.open(target + '.gz')
+        try:
+            self.assertEqual(fileobj.read(), css)
+        finally:
+            fileobj.close()
+        # no timestamp in the file, the same css gives the same bytes
+        compressed = self._read(target + '.gz')
+        ccss.write_gzip(target)
+        self.assertEqual(self._read(target + '.gz'), compressed)
+        self.assertEqual(sorted(os.listdir(self.root)),
+                         ['style.css', 'style.css.gz'])
+
+    def hashed_names(self):
+        options = Values({'hash_names': True})
+        target = os.path.join(self.root, 'style.css')
+        self._write('style.css.part', b'a{color:red}')
+        fname = self._quiet(ccss.publish, target, options)
+        self.assertEqual(fname, os.path.join(
+            self.root, 'style.%s.css' % ccss.assets.hash_file(fname)))
+        self.assertFalse(os.path.exists(target))
+        # the same content again keeps the file as it is
+        os.utime(fname, (0, 0))
+        self._write('style.css.part', b'a{color:red}')
+        self.assertEqual(self._quiet(ccss.publish, target, options), fname)
+        self.assertEqual(os.path.getmtime(fname), 0)
+        self.assertEqual(sorted(os.listdir(self.root)),
+                         [os.path.basename(fname)])
+        self._write('style.css.part', b'a{color:blue}')
+        self.assertNotEqual(self._quiet(ccss.publish, target, options), fname)
+
+    def unchanged_files(self):
+        options = Values({'hash_names': False})
+        target = self._write('style.css', b'a{color:red}')
+        os.utime(target, (0, 0))
+        self._write('style.css.part', b'a{color:red}')
+        self.assertEqual(self._quiet(ccss.publish, target, options), target)
+        self.assertEqual(os.path.getmtime(target), 0)
+        self._write('style.css.part', b'a{color:blue}')
+        self._quiet(ccss.publish, target, options)
+        self.assertEqual(self._read(target), b'a{color:blue}')
+        self.assertEqual(os.listdir(self.root), ['style.css'])
+
+    def merged_manifest(self):
+        manifest = os.path.join(self.root, 'out', 'manifest.json')
+        css = os.path.join(self.root, 'css')
+        written = {os.path.join(css, 'a.css'): os.path.join(css, 'a.1.css')}
+        # the directory of the manifest is created
+        self._quiet(ccss.write_manifest, manifest, written)
+        self._write(os.path.join('out', 'manifest.json'),
+                    b'{"b.css": "b.2.css", "../css/a.css": "old.css"}')
+        self._quiet(ccss.write_manifest, manifest, written)
+        data = self._read(manifest).decode('utf-8')
+        self.assertEqual(json.loads(data), {'../css/a.css': '../css/a.1.css',
+                                            'b.css': 'b.2.css'})
+        os.utime(manifest, (0, 0))
+        self._quiet(ccss.write_manifest, manifest, written)
+        self.assertEqual(os.path.getmtime(manifest), 0)
+        self.assertEqual(self._read(manifest).decode('utf-8'), data)
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [CommandTestCase])
+
+# vim: et sw=4 sts=4
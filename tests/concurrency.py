@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+import threading
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+from textwrap import dedent
+
+import clevercss
+from clevercss.engine import Engine
+
+source = dedent('''
+    base = $accent.darken(20%)
+    spacing = 4px * $scale
+
+    body:
+        color: $base
+        background-color: $accent.brighten(10%)
+        padding: $spacing $spacing * 2
+
+        div.header, div.footer:
+            border: 1px solid $base
+            margin: $spacing + 2px
+            a:
+                color: $accent
+                &:hover:
+                    color: $accent.darken(5%)
+    ''')
+
+class ConcurrentEvaluateTestCase(TestCase):
+    def evaluate_keeps_context(self):
+        context = clevercss.Context({'accent': 'red', 'scale': '2'})
+        engine = Engine(source)
+        list(engine.evaluate(context))
+        self.assertEqual(context, {'accent': 'red', 'scale': '2'})
+
+    def circular_variables(self):
+        engine = Engine(dedent('''
+            foo = $bar
+            bar = $foo
+            body:
+                color: $foo
+            '''))
+        context = clevercss.Context()
+        self.assertRaises(clevercss.errors.EvalException, engine.to_css, context)
+        self.assertRaises(clevercss.errors.EvalException, engine.to_css, context)
+
+    def render_from_many_threads(self):
+        engine = Engine(source)
+        contexts = []
+        for i in range(16):
+            context = clevercss.Context({'accent': '#%02x%02x%02x' % (
+                i * 16, 255 - i * 16, i * 8), 'scale': str(i + 1)})
+            context.minified = bool(i % 2)
+            contexts.append(context)
+        expected = [Engine(source).to_css(context) for context in contexts]
+
+        results = {}
+        errors = []
+        def render(thread_id):
+            try:
+                for n in range(50):
+                    idx = (thread_id + n) % len(contexts)
+                    got = engine.to_css(contexts[idx])
+                    if got != expected[idx]:
+                        results[thread_id] = (idx, got)
+                        return
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=render, args=(i,))
+                   for i in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(results, {})
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [ConcurrentEvaluateTestCase])
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+from textwrap import dedent
+
+from clevercss import convert
+from clevercss.errors import *
+
+source = dedent('''
+    accent = #336699
+    alias = $accent
+    dark = $accent.darken(20%)
+
+    body:
+        color: $accent
+        border: 1px solid $alias
+        background-color: $dark
+
+    a:
+        color: $accent.brighten(10%)
+    ''')
+
+class CustomPropertiesTestCase(TestCase):
+    def custom_properties(self):
+        self.assertEqual(convert(source, custom_properties=['accent', 'dark']),
+            dedent('''\
+            :root {
+              --accent: #336699;
+              --dark: #0a141f;
+            }
+
+            body {
+              color: var(--accent);
+              border: 1px solid var(--accent);
+              background-color: var(--dark);
+            }
+
+            a {
+              color: #3870a8;
+            }'''))
+
+    def custom_properties_minified(self):
+        self.assertEqual(convert(source, custom_properties=['accent'],
+                                 minified=True),
+            ':root{--accent:#369}body{color:var(--accent);border:1px solid '
+            'var(--accent);background-color:#0a141f}a{color:#3870a8}')
+
+    def custom_properties_from_context(self):
+        self.assertEqual(convert('body:\n  color: $text\n', {'text': 'red'},
+                                 custom_properties=['text']),
+            ':root {\n  --text: red;\n}\n\nbody {\n  color: var(--text);\n}')
+
+    def custom_properties_undefined(self):
+        self.assertRaises(EvalException, convert, source,
+                          custom_properties=['missing'])
+        # the error points at the first reference
+        try:
+            convert('a:\n  color: red\nb:\n  color: $missing\n',
+                    custom_properties=['missing'])
+        except EvalException as e:
+            self.assertEqual(e.lineno, 4)
+        else:
+            self.fail('no error for an undefined custom property')
+
+    def custom_properties_circular(self):
+        self.assertRaises(EvalException, convert,
+                          'a = $b\nb = $a\nbody:\n  color: $a\n',
+                          custom_properties=['c'], context={'c': '1'})
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [CustomPropertiesTestCase])
+
+# vim: et sw=4 sts=4
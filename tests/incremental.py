@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+from textwrap import dedent
+
+import clevercss
+from clevercss.engine import Engine
+from clevercss.incremental import IncrementalRenderer
+
+source = dedent('''
+    dark = $accent.darken(20%)
+
+    def bordered:
+        border: 1px solid $frame
+
+    body:
+        color: $dark
+        margin: $gap
+
+    div.box:
+        $bordered
+        padding: 4px
+
+    a:
+        color: $accent
+    ''')
+
+class DependencyTestCase(TestCase):
+    def rule_dependencies(self):
+        engine = Engine(source)
+        self.assertEqual(engine.dependencies(), [
+            frozenset(['dark', 'accent', 'gap']),
+            frozenset(['frame']),
+            frozenset(['accent'])])
+
+class IncrementalRendererTestCase(TestCase):
+    def render_matches_convert(self):
+        context = {'accent': 'red', 'gap': '2px', 'frame': 'black'}
+        renderer = IncrementalRenderer(Engine(source), context)
+        self.assertEqual(renderer.render(), clevercss.convert(source, context))
+        context['accent'] = '#336699'
+        self.assertEqual(renderer.render({'accent': '#336699'}),
+                         clevercss.convert(source, context))
+
+    def render_changed_only(self):
+        context = {'accent': 'red', 'gap': '2px', 'frame': 'black'}
+        renderer = IncrementalRenderer(Engine(source), context)
+        renderer.render()
+        self.assertEqual(renderer.render({'frame': 'blue'}, changed_only=True),
+                         'div.box {\n  border: 1px solid blue;\n'
+                         '  padding: 4px;\n}')
+        self.assertEqual(renderer.render({'frame': 'blue'}, changed_only=True),
+                         '')
+
+    def render_context_references(self):
+        renderer = IncrementalRenderer(Engine(source), {
+            'accent': '$brand', 'brand': 'red', 'gap': '2px',
+            'frame': 'black'})
+        renderer.render()
+        self.assertEqual(renderer.render({'brand': 'blue'}, changed_only=True),
+                         'body {\n  color: #000033;\n  margin: 2px;\n}\n\n'
+                         'a {\n  color: blue;\n}')
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in
+                              [DependencyTestCase, IncrementalRendererTestCase])
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+from clevercss import convert
+from clevercss.engine import Parser
+from clevercss.expressions import Number, Value, Color
+from clevercss.errors import *
+
+class LiteralPoolTestCase(TestCase):
+    def parser_shares_literals(self):
+        parser = Parser()
+        first = parser.parse_expr(1, '0 1px #fff red')
+        second = parser.parse_expr(2, '0 1px #fff red')
+        for a, b in zip(first.nodes, second.nodes):
+            self.assertTrue(a is b)
+        self.assertEqual(first.nodes[0].lineno, None)
+
+    def arithmetic_shares_literals(self):
+        self.assertTrue(Number.intern(1).add(Number.intern(1), None)
+                        is Number.intern(2))
+        self.assertTrue(Value.intern(50, '%').mul(Number.intern(2), None)
+                        is Value.intern(100, '%'))
+        self.assertTrue(Color.intern((255, 255, 255))
+                        is Color.intern('#fff'))
+
+    def named_colors(self):
+        self.assertTrue(Color.intern('red') is Color.intern('red'))
+        self.assertTrue(Color.intern('red').from_name)
+        self.assertFalse(Color.intern('#f00').from_name)
+        self.assertEqual(convert('a:\n  color: red\n  b: red + 0\n'),
+                         'a {\n  color: red;\n  b: #ff0000;\n}')
+
+    def negative_zero(self):
+        self.assertEqual(convert('a:\n  b: -0 0\n  c: 0px\n'),
+                         'a {\n  b: -0 0;\n  c: 0px;\n}')
+        self.assertFalse(Number.intern(-0.0) is Number.intern(0.0))
+
+    def error_line_numbers(self):
+        for source in ('a:\n  b: 1 / 0\n', 'a:\n  b: red.darken(2px)\n',
+                       'a:\n  b: -red\n'):
+            try:
+                convert(source)
+            except EvalException as e:
+                self.assertEqual(e.lineno, 2)
+            else:
+                self.fail('EvalException not raised')
+
+    def invalid_colors(self):
+        self.assertRaises(ParserError, Color.intern, 'nocolor')
+        self.assertRaises(ParserError, Color.intern, '#ff_fff')
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [LiteralPoolTestCase])
+
+# vim: et sw=4 sts=4
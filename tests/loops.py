@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+from textwrap import dedent
+
+from clevercss import convert
+from clevercss.engine import Engine
+from clevercss.expressions import Value
+from clevercss.errors import *
+
+class LoopTestCase(TestCase):
+    def same_as_written_out(self):
+        self.assertEqual(convert(dedent('''
+            for $i in 1..3:
+                .mt-$i:
+                    margin-top: $i * 0.25em
+                .col-${i}, .span-$i:
+                    &:hover:
+                        padding: 1px $i * 2px
+            ''')), convert(''.join(
+                '.mt-%d:\n  margin-top: %d * 0.25em\n'
+                '.col-%d, .span-%d:\n  &:hover:\n    padding: 1px %d * 2px\n'
+                % ((i,) * 5) for i in range(1, 4))))
+
+    def nested_loops(self):
+        self.assertEqual(convert(dedent('''
+            @media print:
+                for $i in 2..1:
+                    for $j in 1..2:
+                        .g-$i-$j:
+                            order: $i * 10 + $j
+            ''')), dedent('''\
+            @media print {
+
+              .g-2-1 {
+                order: 21;
+              }
+
+              .g-2-2 {
+                order: 22;
+              }
+
+              .g-1-1 {
+                order: 11;
+              }
+
+              .g-1-2 {
+                order: 12;
+              }
+
+            }'''))
+
+    def parsed_once(self):
+        rules = list(Engine(dedent('''
+            for $i in 1..2:
+                .w-$i:
+                    width: $i * 10%
+                    height: $i * $unit
+            ''')).rules)
+        # expressions of the loop alone are computed while parsing
+        self.assertEqual([defs[0][1] for media, selectors, defs in rules],
+                         [Value.intern(10, '%'), Value.intern(20, '%')])
+        self.assertEqual(rules[0][2][1][1].variables(), set(['unit']))
+        self.assertEqual(convert('for $i in 1..2:\n  .h-$i:\n'
+                                 '    height: $i * $unit\n', {'unit': '3px'}),
+                         '.h-1 {\n  height: 3px;\n}\n\n'
+                         '.h-2 {\n  height: 6px;\n}')
+
+    def formatted_at_render_time(self):
+        source = dedent('''
+            for $i in 1..2:
+                .a-$i:
+                    content: ($i * 0.5).string()
+            ''')
+        self.assertEqual(convert(source),
+                         '.a-1 {\n  content: 0.5;\n}\n\n'
+                         '.a-2 {\n  content: 1;\n}')
+        self.assertEqual(convert(source, minified=True),
+                         '.a-1{content:.5}.a-2{content:1}')
+
+    def errors(self):
+        for source, lineno in [('a:\n  color: red\nfor $i in 1:\n  b:\n'
+                                '    c: d\n', 3),
+                               ('for $i in 1..2:\n  color: red\n', 1),
+                               ('for $i in 1..2:\n  a-$i:\n'
+                                '    width: 1px + $i%\n', 3)]:
+            try:
+                convert(source)
+            except (ParserError, EvalException) as e:
+                self.assertEqual(e.lineno, lineno)
+            else:
+                self.fail('expected an error for %r' % source)
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [LoopTestCase])
+
+# vim: et sw=4 sts=4
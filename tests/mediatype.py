@@ -198,8 +198,71 @@ class MediaTypeTestCase(TestCase):
             """,
             minified=True)
 
-    def _assertConversion(self, ccss, css, minified=False):
-        got = convert(dedent(ccss), minified=minified)
+    def test_07_grouped_media_type(self):
+        self._assertConversion(
+            """
+            @media print:
+              #content:
+                background: none
+                @media handheld:
+                  strong:
+                    font-weight: bold
+              a:
+                text-decoration: none
+
+            a:
+                color: red
+
+            @media handheld:
+                td:
+                    background-color: green""",
+            """
+            a{
+                color:red}
+            @media print{
+              #content{
+                background:none}
+              a{
+                text-decoration:none}
+            }
+            @media handheld{
+              #content strong{
+                font-weight:bold}
+              td{
+                background-color:green}
+            }
+            """,
+            minified=True, group_media=True)
+
+    def test_08_mobile_first_media_type(self):
+        self._assertConversion(
+            """
+            a:
+              @media (min-width: 60em):
+                color: blue
+              @media print:
+                color: black
+              @media (min-width: 480px):
+                color: green""",
+            """
+            @media print{
+              a{
+                color:#000}
+            }
+            @media (min-width: 480px){
+              a{
+                color:green}
+            }
+            @media (min-width: 60em){
+              a{
+                color:#00f}
+            }
+            """,
+            minified=True, group_media='mobile-first')
+
+    def _assertConversion(self, ccss, css, minified=False, group_media=False):
+        got = convert(dedent(ccss), minified=minified,
+                      group_media=group_media)
         expected = dedent(css).lstrip()
         if minified:
             expected = ''.join(line.lstrip(' ') for line in expected.splitlines())
@@ -29,6 +29,17 @@ class MinifiedConvertTestCase(TestCase):
         ''', minified=True),
         u'body{background-color:#ff0;color:snow}body p{background-color:red;color:khaki}')
 
+    def test_03_min_convert_values(self):
+        self.assertEqual(convert('''ul > li, a  +  b ~ c, [title~="a > b"]:
+            margin: 0px -0.5em 0.25em 0%
+            font-family: Verdana, sans-serif
+            color: rgba(255, 0, 0, 1)
+            background: rgba(0, 0, 0, 0.5)
+        ''', minified=True),
+        u'ul>li,a+b~c,[title~="a > b"]{margin:0 -.5em .25em 0%;'
+        u'font-family:Verdana,sans-serif;color:red;'
+        u'background:rgba(0,0,0,.5)}')
+
 def all_tests():
     return unittest.TestSuite(case.toSuite() for case in [MinifiedConvertTestCase])
 
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+from textwrap import dedent
+
+from clevercss import Context, convert
+from clevercss.engine import Engine
+from clevercss import optimizer
+
+source = dedent('''
+    def box:
+        margin-top: 1px
+        margin-right: 2px
+        margin-bottom: 1px
+        margin-left: 2px
+        color: red
+    a:
+        $box
+        color: blue
+    b:
+        color: green
+    a:
+        padding: 0
+    c:
+        color: green
+    d:
+        display: -webkit-box
+        display: flex
+        color: red
+    c:
+        color: black
+    ''')
+
+class OptimizerTestCase(TestCase):
+    def optimized(self):
+        self.assertEqual(convert(source, optimize=True, minified=True),
+                         'a{margin:1px 2px;color:#00f;padding:0}'
+                         'b,c{color:green}'
+                         'd{display:-webkit-box;display:flex;color:red}'
+                         'c{color:#000}')
+
+    def dedupe(self):
+        self.assertEqual(optimizer.dedupe([('color', 'red'),
+                                           ('color', 'blue !important'),
+                                           ('color', 'red'),
+                                           ('color', 'blue')]),
+                         [('color', 'blue !important'), ('color', 'blue')])
+
+    def collapse(self):
+        sides = ['margin-top', 'margin-right', 'margin-bottom', 'margin-left']
+        for values, shorthand in [('1 2 3 4', '1 2 3 4'), ('1 2 3 2', '1 2 3'),
+                                  ('1 2 1 2', '1 2'), ('1 1 1 1', '1')]:
+            self.assertEqual(optimizer.collapse(
+                [('color', 'red')] + list(zip(sides, values.split()))),
+                [('color', 'red'), ('margin', shorthand)])
+        defs = list(zip(sides, ['1px', 'inherit', '1px', '1px']))
+        self.assertEqual(optimizer.collapse(defs), defs)
+        # the shorthand would override margin-inline-start
+        defs = [('margin-left', '1px'), ('margin-inline-start', '2px'),
+                ('margin-top', '0'), ('margin-right', '0'),
+                ('margin-bottom', '0')]
+        self.assertEqual(optimizer.collapse(defs), defs)
+        self.assertEqual(optimizer.collapse(defs[:1] + defs[2:] + defs[1:2]),
+                         [('margin', '0 0 0 1px'),
+                          ('margin-inline-start', '2px')])
+
+    def shorthand_families(self):
+        self.assertEqual([optimizer.family(key) for key in
+                          ['line-height', '-moz-border-radius', 'left',
+                           'row-gap', 'column-gap', 'column-count',
+                           'justify-content', 'grid-gap', 'grid-row-gap',
+                           'grid-column-gap', 'grid-column']],
+                         ['font', 'border', 'inset', 'gap', 'gap', 'column',
+                          'place', 'gap', 'gap', 'gap', 'grid'])
+        # font resets line-height, .x can't move above .y
+        for between in ['font: 12px serif', 'all: unset']:
+            source = dedent('''
+                .x:
+                    line-height: 1
+                .y:
+                    %s
+                .x:
+                    line-height: 2
+                ''' % between)
+            self.assertEqual(convert(source, optimize=True),
+                             convert(source))
+        # grid-gap is an alias of gap, .x can't move above .y either way
+        for first, second in [('gap', 'grid-gap'), ('grid-gap', 'gap')]:
+            source = dedent('''
+                .x:
+                    %s: 1px
+                .y:
+                    %s: 2px
+                .x:
+                    %s: 3px
+                ''' % (first, second, first))
+            self.assertEqual(convert(source, optimize=True),
+                             convert(source))
+
+    def report(self):
+        css, stats = optimizer.optimize_css(Engine(source), Context())
+        self.assertEqual(css, convert(source, optimize=True))
+        self.assertEqual((stats['rules_before'], stats['rules_after']),
+                         (6, 4))
+        self.assertEqual(stats['bytes_saved'],
+                         len(convert(source)) - len(css))
+
+    def grouped_macros(self):
+        source = dedent('''
+            def box:
+                margin: 0
+                border: 1px solid red
+            a:
+                $box
+                color: blue
+            b:
+                color: red
+                $box
+            c:
+                border-width: 2px
+                $box
+            d:
+                $box
+            e:
+                $box
+            ''')
+        self.assertEqual(Engine(source).rules.macro_calls,
+                         {0: (('box', 0, 2),), 1: (('box', 1, 3),),
+                          2: (('box', 1, 3),), 3: (('box', 0, 2),),
+                          4: (('box', 0, 2),)})
+        # c sets a border before the call, d can't move above c
+        self.assertEqual(convert(source, minified=True, group_macros=True),
+                         'a,b{margin:0;border:1px solid red}'
+                         'a{color:#00f}b{color:red}'
+                         'c{border-width:2px;margin:0;border:1px solid red}'
+                         'd,e{margin:0;border:1px solid red}')
+
+    def canonical_order(self):
+        self.assertEqual(optimizer.sort_declarations([
+            ('margin', '0'), ('line-height', '1'), ('color', 'red'),
+            ('font', '12px serif'), ('margin-top', '1px')]),
+            [('color', 'red'), ('line-height', '1'), ('font', '12px serif'),
+             ('margin', '0'), ('margin-top', '1px')])
+        # gap has to stay after its alias grid-gap
+        self.assertEqual(optimizer.sort_declarations([
+            ('grid-gap', '2px'), ('color', 'red'), ('gap', '1px'),
+            ('grid-template-columns', '1fr')]),
+            [('color', 'red'), ('grid-gap', '2px'), ('gap', '1px'),
+             ('grid-template-columns', '1fr')])
+        # b can't move up to a, c sets its color in between
+        self.assertEqual(convert(dedent('''
+            a:
+                margin: 0
+                color: red
+            p:
+                color: blue
+            b:
+                color: green
+                margin: 1px
+            c:
+                margin: 2px
+                color: black
+            '''), minified=True, canonical_order=True),
+            'a{color:red;margin:0}p{color:#00f}'
+            'b{color:green;margin:1px}c{color:#000;margin:2px}')
+        self.assertEqual(optimizer.cluster([
+            (None, ['a'], [('color', 'red')]),
+            (None, ['b'], [('margin', '0')]),
+            (None, ['c'], [('color', 'blue')])]),
+            [(None, ['a'], [('color', 'red')]),
+             (None, ['c'], [('color', 'blue')]),
+             (None, ['b'], [('margin', '0')])])
+        # font resets line-height, .z stays after .y
+        rules = [(None, ['.x'], [('color', 'red'), ('line-height', '1')]),
+                 (None, ['.y'], [('font', '12px serif')]),
+                 (None, ['.z'], [('color', 'red'), ('line-height', '2')])]
+        self.assertEqual(optimizer.cluster(rules), rules)
+        rules[1] = (None, ['.y'], [('all', 'unset')])
+        self.assertEqual(optimizer.cluster(rules), rules)
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [OptimizerTestCase])
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+import clevercss
+from clevercss import palette
+
+colors = ['#336699', 'orange', 'black', 'white', '#0a64fa']
+amounts = [0, 10, 12.5, 50, 100]
+
+def css(rows):
+    context = clevercss.Context()
+    return [[color.to_string(context) for color in row] for row in rows]
+
+class PaletteTestCase(TestCase):
+    def same_as_methods(self):
+        rows = css(palette.darken(colors, amounts, vectorized=False))
+        for color, row in zip(colors, rows):
+            for amount, result in zip(amounts, row):
+                self.assertEqual(
+                    clevercss.convert('a:\n  b: %s.darken(%s%%)\n' %
+                                      (color, amount)),
+                    'a {\n  b: %s;\n}' % result)
+        self.assertEqual(css(palette.mix(['red'], 'blue', [0, 50, 100],
+                                         vectorized=False)),
+                         [['red', '#800080', 'blue']])
+        self.assertEqual(css(palette.tint(['black'], [100],
+                                          vectorized=False)),
+                         [['#000000']])
+
+    def vectorized(self):
+        if palette.numpy is None:
+            self.assertRaises(RuntimeError, palette.tint, colors, amounts,
+                              vectorized=True)
+            return
+        shades = [(value, saturation) for value in (-100, -20, 0, 30, 100)
+                  for saturation in (-50, 0, 40)]
+        for name, args in [('brighten', (colors, amounts)),
+                           ('darken', (colors, amounts)),
+                           ('tint', (colors, amounts)),
+                           ('shade', (colors, shades)),
+                           ('mix', (colors, 'navy', amounts))]:
+            function = getattr(palette, name)
+            self.assertEqual(css(function(*args, vectorized=True)),
+                             css(function(*args, vectorized=False)))
+
+    def context(self):
+        tints = palette.tint(['#336699', 'orange'], [20, 60])
+        context = palette.to_context(tints, ['brand', 'accent'], [20, 60])
+        self.assertEqual(sorted(context), ['accent_20', 'accent_60',
+                                           'brand_20', 'brand_60'])
+        self.assertEqual(clevercss.convert('a:\n  color: $brand_60\n',
+                                           context),
+                         'a {\n  color: #87a3c0;\n}')
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [PaletteTestCase])
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+import clevercss
+from clevercss import convert
+from clevercss import parallel
+from clevercss.errors import *
+
+def utility_classes(count):
+    lines = ['unit = 4px', 'accent = #336699']
+    for i in range(count):
+        if i % 50 == 0:
+            lines.append('@media screen and (min-width: %dpx):' % (i * 10))
+            indent = '    '
+        elif i % 50 == 25:
+            indent = ''
+        lines.append(indent + '.mt-%d, .mb-%d:' % (i, i))
+        lines.append(indent + '    margin-top: $unit * %d' % i)
+        lines.append(indent + '    color: $accent.brighten(%d%%)' % (i % 100))
+        lines.append(indent + '    box-sizing: border-box')
+    return '\n'.join(lines)
+
+class ParallelEvaluateTestCase(TestCase):
+    def parallel_identical_output(self):
+        if parallel._get_fork_context() is None:
+            self.skipTest('forking is not available')
+        source = utility_classes(600)
+        for minified in (False, True):
+            self.assertEqual(convert(source, minified=minified, processes=3),
+                             convert(source, minified=minified))
+
+    def parallel_small_chunks(self):
+        source = utility_classes(60)
+        engine = clevercss.engine.Engine(source)
+        context = clevercss.Context()
+        blocks = list(parallel.format_rules(engine, context, 2, chunksize=7))
+        self.assertEqual(engine.join_rules(blocks), convert(source))
+
+    def parallel_errors(self):
+        if parallel._get_fork_context() is None:
+            self.skipTest('forking is not available')
+        source = utility_classes(600) + '\nfoo:\n    color: $missing\n'
+        try:
+            convert(source, processes=2)
+        except EvalException as e:
+            self.assertEqual(e.lineno, len(source.splitlines()))
+        else:
+            self.fail('EvalException not raised')
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [ParallelEvaluateTestCase])
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+from textwrap import dedent
+
+from clevercss.engine import Engine
+from clevercss.ruletable import RuleTable
+from clevercss.errors import ParserError
+
+source = dedent('''
+    @media print:
+        div.content p, div.sidebar p:
+            margin: 0
+            a:
+                color: red
+                &:hover, &:focus:
+                    color: blue
+                    margin: 0
+    ''')
+
+class RuleTableTestCase(TestCase):
+    def parsed_rules(self):
+        rules = Engine(source).rules
+        self.assertTrue(isinstance(rules, RuleTable))
+        self.assertEqual(len(rules), 3)
+        self.assertEqual([(media, selectors, [key for key, expr in defs])
+                          for media, selectors, defs in rules], [
+            ('print', ['div.content p', 'div.sidebar p'], ['margin']),
+            ('print', ['div.content p a', 'div.sidebar p a'], ['color']),
+            ('print', ['div.content p a:hover', 'div.sidebar p a:hover',
+                       'div.content p a:focus', 'div.sidebar p a:focus'],
+             ['color', 'margin'])])
+        self.assertEqual(rules[-1], rules[2])
+        self.assertRaises(IndexError, lambda: rules[3])
+
+    def nested_references(self):
+        rules = Engine(dedent('''
+            @media print:
+                color: red
+            &.top:
+                ul, ol:
+                    &:hover, p &:
+                        color: blue
+            ''')).rules
+        self.assertEqual([selectors for media, selectors, defs in rules], [
+            [''], ['*.top ul:hover', '*.top p ul', '*.top ol:hover',
+                   '*.top p ol']])
+
+    def interned_columns(self):
+        rules = Engine(source).rules
+        self.assertEqual(rules.media.strings, ['print'])
+        self.assertEqual(rules.properties.strings, ['margin', 'color'])
+        self.assertEqual(sorted(rules.parts.strings),
+                         ['a', 'a:focus', 'a:hover', 'div.content p',
+                          'div.sidebar p'])
+        # one group per block, the prefixes are stored once
+        self.assertEqual(list(rules.group_sizes), [2, 2, 4])
+
+    def append_after_compact(self):
+        rules = RuleTable()
+        body = rules.add_group(['body'])
+        first = rules.add_group(['p', 'a'], body)
+        rules.compact()
+        self.assertEqual(rules.add_group(['p', 'a'], body), first)
+        rules.append(None, first, [('color', None)])
+        self.assertEqual(list(rules),
+                         [(None, ['body p', 'body a'], [('color', None)])])
+
+fan_out = dedent('''
+    .light, .dark:
+        .a, .b, .c, .d:
+            color: red
+            h1, h2, h3,
+            h4, h5, h6:
+                margin: 0
+    ''')
+
+class SelectorGroupTestCase(TestCase):
+    def expansion_factors(self):
+        engine = Engine(fan_out)
+        self.assertEqual(engine.selector_expansion(), [8 / 6.0, 48 / 12.0])
+        self.assertEqual(len(list(engine.rules)[1][1]), 48)
+
+    def prefixes_per_pass(self):
+        rules = Engine(fan_out).rules
+        state = dict((key, dict(value) if isinstance(value, dict) else value)
+                     for key, value in vars(rules).items())
+        expanded = list(rules)
+        # the expanded parent groups don't outlive a pass over the rules
+        self.assertEqual(vars(rules), state)
+        self.assertEqual(list(rules), expanded)
+        self.assertEqual(rules[1], expanded[1])
+
+    def fan_out_limit(self):
+        self.assertEqual(len(Engine(fan_out, max_selectors=48).rules), 2)
+        try:
+            Engine(fan_out, max_selectors=20)
+        except ParserError as e:
+            self.assertEqual(e.lineno, 5)
+        else:
+            self.fail('expected a ParserError')
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in
+                              [RuleTableTestCase, SelectorGroupTestCase])
+
+# vim: et sw=4 sts=4
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+from io import StringIO
+
+from clevercss import Context, convert, convert_to, convert_variants
+from clevercss.engine import Engine
+
+source = ''.join('.c%d, .d%d:\n  width: %dpx\n  &:hover:\n    margin: 1px\n'
+                 '@media print:\n  .p%d:\n    display: none\n'
+                 % (i, i, i, i) for i in range(300))
+
+class WriteCssTestCase(TestCase):
+    def same_as_to_css(self):
+        engine = Engine(source)
+        for minified in (False, True):
+            context = Context()
+            context.minified = minified
+            for buffer_size in (1, 100, 65536):
+                fileobj = StringIO()
+                engine.write_css(fileobj, context, buffer_size)
+                self.assertEqual(fileobj.getvalue(), engine.to_css(context))
+            fileobj = StringIO()
+            convert_to(fileobj, source, minified=minified)
+            self.assertEqual(fileobj.getvalue(),
+                             convert(source, minified=minified))
+
+    def minified_lines(self):
+        lines = convert(source, minified=True).split('\n')
+        self.assertTrue(len(lines) > 5)
+        for line in lines[:-1]:
+            self.assertTrue(line.endswith('}'))
+            self.assertEqual(line.index('}', 2000), len(line) - 1)
+
+    def line_length(self):
+        self.assertEqual(convert(source, minified=True, line_length=0),
+                         convert(source, minified=True).replace('\n', ''))
+        self.assertTrue('\n' not in convert(source, minified=True,
+                                             line_length=0))
+        lines = convert(source, minified=True, line_length=300).split('\n')
+        for line in lines[:-1]:
+            self.assertEqual(line.index('}', 300), len(line) - 1)
+        self.assertEqual(convert_variants(source, {'a': {}}, minified=True,
+                                          line_length=300)['a'],
+                         '\n'.join(lines))
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [WriteCssTestCase])
+
+# vim: et sw=4 sts=4
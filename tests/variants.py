@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+
+import unittest
+from tests.magictest import MagicTest as TestCase
+
+from textwrap import dedent
+
+import clevercss
+from clevercss import convert, convert_variants
+from clevercss import parallel
+
+source = dedent('''
+    dark = $brand.darken(30%)
+
+    body:
+        color: $text
+        font-family: Verdana, sans-serif
+
+    a:
+        color: $brand
+        &:hover:
+            color: $dark
+
+    @media print:
+        a:
+            color: black
+    ''')
+
+variants = {
+    'red': {'brand': 'red'},
+    'blue': {'brand': '#0000ff', 'text': '$brand'},
+    'green': {'brand': 'green'},
+}
+
+class VariantsTestCase(TestCase):
+    def variants_match_convert(self):
+        results = convert_variants(source, variants, {'text': '#333'})
+        self.assertEqual(list(results), list(variants))
+        for name, values in variants.items():
+            context = {'text': '#333'}
+            context.update(values)
+            self.assertEqual(results[name], convert(source, context))
+
+    def variants_minified(self):
+        results = convert_variants(source, variants, {'text': '#333'},
+                                   minified=True)
+        self.assertEqual(results['green'], convert(
+            source, {'text': '#333', 'brand': 'green'}, minified=True))
+
+    def variants_parallel(self):
+        if parallel._get_fork_context() is None:
+            self.skipTest('forking is not available')
+        self.assertEqual(
+            convert_variants(source, variants, {'text': '#333'}, processes=2),
+            convert_variants(source, variants, {'text': '#333'}))
+
+    def variants_share_rules(self):
+        engine = clevercss.engine.Engine(source)
+        context = engine.parse_context({'text': '#333', 'brand': 'red'})
+        self.assertEqual(engine.dependent_rules(['brand'], context), [1, 2])
+        context = engine.parse_context({'text': '$brand', 'brand': 'red'})
+        self.assertEqual(engine.dependent_rules(['brand'], context), [0, 1, 2])
+
+def all_tests():
+    return unittest.TestSuite(case.toSuite() for case in [VariantsTestCase])
+
+# vim: et sw=4 sts=4